@@ -0,0 +1,152 @@
+"""Compares config size and encode/decode time of the JSON and binary manifests.
+
+Paths come from a synthetic source-tree-like layout, or from a real folder
+given with --tree. Timings include AES-EAX encryption of each chunk. Sizes
+leave out the fixed nonce, tag and header that every chunk carries.
+
+The whole config is then written with `ConfigWriter`, and listing the files
+under one directory through the index is timed against a full read. The
+directory is the one of the first file unless --select is given.
+
+Usage: python -m benchmarks.bench_config [--files 1000000] [--tree PATH]
+           [--select PREFIX]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from folderhide.config import (
+    CHUNK_SIZE,
+    ConfigReader,
+    ConfigWriter,
+    decode_entries,
+    dir_key,
+    encode_entries,
+)
+from folderhide.utils import (
+    FileMetadata,
+    Layout,
+    derive_key,
+    generate_config,
+    get_all_files,
+    get_cipher,
+    new_kdf_params,
+    random_str,
+)
+
+WORDS = [
+    "src", "lib", "test", "docs", "assets", "images", "build", "vendor",
+    "components", "utils", "models", "views", "static", "locale", "data",
+    "cache", "internal", "common", "core", "api", "v1", "v2", "fixtures",
+]  # fmt: skip
+
+
+def synthetic_paths(files: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    paths: List[str] = []
+    while len(paths) < files:
+        depth = rng.randint(1, 8)
+        folder = os.path.join("project", *(rng.choice(WORDS) for _ in range(depth)))
+        for i in range(rng.randint(1, 40)):
+            paths.append(
+                os.path.join(
+                    folder, f"file_{i}{rng.choice(['.py', '.js', '.png', '.json'])}"
+                )
+            )
+
+    return paths[:files]
+
+
+def chunks(entries: List[FileMetadata]):
+    for i in range(0, len(entries), CHUNK_SIZE):
+        yield entries[i : i + CHUNK_SIZE]
+
+
+def measure(
+    label: str, entries: List[FileMetadata], encode: Callable, decode: Callable
+):
+    key = os.urandom(16)
+
+    start = time.perf_counter()
+    encrypted = []
+    for chunk in chunks(entries):
+        cipher = get_cipher(key)
+        text, tag = cipher.encrypt_and_digest(encode(chunk))
+        encrypted.append((cipher.nonce, tag, text))
+    encoded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for nonce, tag, text in encrypted:
+        decode(get_cipher(key, nonce=nonce).decrypt_and_verify(text, tag))
+    decoded = time.perf_counter() - start
+
+    size = sum(len(text) for _, _, text in encrypted)
+    print(
+        f"{label:>8}: {size / 1024 / 1024:8.2f} MiB  encode {encoded:6.2f}s  decode {decoded:6.2f}s"
+    )
+    return size
+
+
+def measure_select(entries: List[FileMetadata], prefix: str):
+    kdf = new_kdf_params()
+    key = derive_key("benchmark", kdf)
+    layout = Layout(os.path.dirname(entries[0].modified))
+    f = io.BytesIO()
+    writer = ConfigWriter(f, key, kdf, layout)
+    for entry in entries:
+        writer.add(entry)
+    writer.finish()
+
+    f.seek(0)
+    reader = ConfigReader(f, "benchmark")
+
+    start = time.perf_counter()
+    selected = sum(1 for _ in reader.select(prefix))
+    indexed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full = sum(1 for entry in reader if entry.original.startswith(prefix))
+    scanned = time.perf_counter() - start
+
+    assert selected == full
+    print(
+        f"  select: {selected} entries under {prefix!r}  "
+        f"index {indexed * 1000:8.1f}ms  full read {scanned * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--tree", help="Use the files of an existing folder instead.")
+    parser.add_argument("--select", help="Path prefix to list through the index.")
+    args = parser.parse_args()
+
+    if args.tree:
+        files = get_all_files(args.tree, Path(args.tree).parent)
+    else:
+        files = synthetic_paths(args.files)
+
+    entries = generate_config(files, Path("." + random_str(8)))
+    print(f"{len(entries)} entries")
+
+    json_size = measure(
+        "json",
+        entries,
+        lambda chunk: json.dumps(chunk).encode(),
+        lambda payload: [FileMetadata(*x) for x in json.loads(payload.decode())],
+    )
+    binary_size = measure("binary", entries, encode_entries, decode_entries)
+    print(f"Binary manifest is {binary_size / json_size:.1%} of the JSON size")
+
+    prefix = args.select or dir_key(entries[0].original)
+    measure_select(entries, prefix.replace("/", os.sep))
+
+
+if __name__ == "__main__":
+    main()
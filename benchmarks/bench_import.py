@@ -0,0 +1,88 @@
+"""Checks the import time of the CLI against a budget.
+
+`python -X importtime` is run a few times on the CLI module and the best
+cumulative time is compared with --budget. Modules that only some commands
+need (pycryptodome, tqdm, multiprocessing, the core and the GUI) must not be
+imported at all.
+
+The exit status is 1 if the budget is exceeded or a deferred module got
+imported, so this can run as a check in CI.
+
+Usage: python -m benchmarks.bench_import [--module folderhide.cli]
+           [--budget 60] [--runs 5]
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFERRED = (
+    "Crypto",
+    "tqdm",
+    "multiprocessing",
+    "PyQt6",
+    "folderhide.core",
+    "folderhide.batch",
+    "folderhide.gui",
+)
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Returns the self and cumulative import time, in microseconds, of every
+    module imported by a fresh interpreter importing `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def is_deferred(name: str):
+    return any(name == d or name.startswith(d + ".") for d in DEFERRED)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="folderhide.cli")
+    parser.add_argument("--budget", type=float, default=60.0, help="milliseconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    elapsed = best[args.module][1] / 1000
+
+    slowest: List[Tuple[str, Tuple[int, int]]] = sorted(
+        best.items(), key=lambda item: item[1][0], reverse=True
+    )
+    print("Slowest modules by self time:")
+    for name, (own, cumulative) in slowest[: args.top]:
+        print(f"{own / 1000:>8.2f}ms {cumulative / 1000:>8.2f}ms  {name}")
+
+    failed = False
+    deferred = sorted(
+        name for name in best if is_deferred(name) and name != args.module
+    )
+    if deferred:
+        print("Imported modules that should be deferred: " + ", ".join(deferred))
+        failed = True
+
+    print(f"{args.module}: {elapsed:.2f}ms (budget {args.budget:.2f}ms)")
+    if elapsed > args.budget:
+        print("Over budget.")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compares hiding tiny files one by one against packing them.
+
+For every file count, a tree of the "tiny" shape is hidden and unhidden
+again with `folderhide.core`, once with every file renamed and once with
+every file put in a pack. The number of entries left in the hidden folder is
+reported as well.
+
+Usage: python -m benchmarks.bench_pack [--counts 10000,100000]
+           [--pack-below 65536] [--jobs 4]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.treegen import make_tree
+from folderhide.core import hide, unhide
+
+PASSWORD = "benchmark"
+MODES = {"rename": 0, "pack": 64 << 10}
+
+
+def _quiet(_: str):
+    pass
+
+
+def run(base: Path, count: int, pack_below: int, jobs: int):
+    folder = base / "folder"
+    make_tree(folder, "tiny", count)
+    config = str(base / "cfg.enc")
+
+    start = time.perf_counter()
+    hide(
+        str(folder),
+        PASSWORD,
+        config,
+        _quiet,
+        _quiet,
+        print,
+        jobs=jobs,
+        kdf_cost=10,
+        pack_below=pack_below,
+    )
+    hidden = time.perf_counter() - start
+
+    target = next(p for p in base.iterdir() if p.name.startswith("."))
+    entries = len(os.listdir(target))
+
+    start = time.perf_counter()
+    unhide(PASSWORD, config, _quiet, _quiet, print, jobs=jobs)
+    unhidden = time.perf_counter() - start
+
+    return hidden, unhidden, entries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="10000,100000")
+    parser.add_argument("--pack-below", type=int, default=MODES["pack"])
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--dir", help="Folder to run in, defaults to the temp dir.")
+    args = parser.parse_args()
+
+    print(f"{'files':>9} {'mode':>6} {'hide':>8} {'unhide':>8} {'entries':>8}")
+    for count in map(int, args.counts.split(",")):
+        for mode, pack_below in MODES.items():
+            if pack_below:
+                pack_below = args.pack_below
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                hidden, unhidden, entries = run(Path(tmp), count, pack_below, args.jobs)
+            print(
+                f"{count:>9} {mode:>6} {hidden:>7.2f}s {unhidden:>7.2f}s {entries:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compares the memory held by the hide plan: a list of `FileMetadata` and a
+set of used names, as hide kept them before, against `folderhide.utils.Plan`.
+
+Paths come from the shapes of `benchmarks.treegen` without touching the disk.
+Every representation is built in a fresh interpreter, which reports its peak
+RSS (on Unix) and the peak memory allocated by Python as seen by tracemalloc.
+
+Usage: python -m benchmarks.bench_plan [--files 5000000] [--shape tiny]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Set
+
+from benchmarks.treegen import SHAPES
+from folderhide.utils import FileMetadata, Layout, Plan, random_names
+
+ROOT = "folder"
+
+
+def paths(shape: str, files: int):
+    func, _ = SHAPES[shape]
+    for folder, name in func(files):
+        yield os.path.join(ROOT, folder, name)
+
+
+def build_list(shape: str, files: int, layout: Layout):
+    used: Set[str] = set()
+    planned: List[FileMetadata] = []
+    names = random_names(16)
+    for i, src in enumerate(paths(shape, files)):
+        name = next(names)
+        while name in used:
+            name = next(names)
+        used.add(name)
+        planned.append(FileMetadata(src, layout.path(name), i))
+    return planned, used
+
+
+def build_plan(shape: str, files: int, layout: Layout):
+    plan = Plan(layout)
+    for i, src in enumerate(paths(shape, files)):
+        plan.add(src, i)
+    return plan
+
+
+BUILDERS = {"list": build_list, "plan": build_plan}
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return 0
+
+    # Kilobytes on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(builder: str, shape: str, files: int, traced: bool):
+    layout = Layout(".hidden")
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = BUILDERS[builder](shape, files, layout)
+    elapsed = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] if traced else 0
+    del result
+    return {"time": elapsed, "rss": peak_rss(), "traced": traced_peak}
+
+
+def run(builder: str, shape: str, files: int, traced: bool):
+    command = [sys.executable, "-m", "benchmarks.bench_plan", "--child", builder]
+    command += ["--shape", shape, "--files", str(files)]
+    if traced:
+        command.append("--traced")
+    output = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--shape", default="tiny", choices=sorted(SHAPES))
+    parser.add_argument("--child", choices=sorted(BUILDERS), help=argparse.SUPPRESS)
+    parser.add_argument("--traced", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.shape, args.files, args.traced)))
+        return
+
+    MiB = 1024 * 1024
+    results = {}
+    for builder in BUILDERS:
+        # RSS and time are measured without tracemalloc, which slows Python
+        # down and takes memory of its own.
+        result = run(builder, args.shape, args.files, False)
+        result["traced"] = run(builder, args.shape, args.files, True)["traced"]
+        results[builder] = result
+        print(
+            f"{builder:>6}: {result['time']:.2f}s, "
+            f"peak RSS {result['rss'] / MiB:.1f} MiB, "
+            f"traced peak {result['traced'] / MiB:.1f} MiB"
+        )
+
+    old, new = results["list"], results["plan"]
+    if new["rss"]:
+        print(f"Peak RSS: {old['rss'] / new['rss']:.2f}x smaller")
+    print(f"Traced peak: {old['traced'] / new['traced']:.2f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measures rename throughput into flat and sharded hidden layouts.
+
+For every file count, a flat folder of that many files is hidden into a
+target directory with each layout, then every hidden file is looked up again
+with `os.stat`.
+
+Usage: python -m benchmarks.bench_shards [--counts 10000,100000,1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from folderhide.mover import Move, move_files
+from folderhide.progress import Progress
+from folderhide.utils import Layout, plan_files
+
+LAYOUTS = {"flat": (0, 1), "1x1": (1, 1), "2x1": (2, 1), "1x2": (1, 2)}
+
+
+def run(base: Path, count: int, depth: int, width: int):
+    source = base / "source"
+    source.mkdir()
+    for i in range(count):
+        (source / str(i)).touch()
+
+    layout = Layout(str(base / ".target"), depth, width)
+    plan = list(plan_files((str(source / str(i)) for i in range(count)), layout))
+
+    start = time.perf_counter()
+    move_files(
+        (Move(i, cfg.original, cfg.modified) for i, cfg in enumerate(plan)),
+        Progress(),
+    )
+    moved = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for cfg in plan:
+        os.stat(cfg.modified)
+    looked_up = time.perf_counter() - start
+
+    return count / moved, count / looked_up
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="10000,100000,1000000")
+    parser.add_argument("--dir", help="Folder to run in, defaults to the temp dir.")
+    args = parser.parse_args()
+
+    print(f"{'files':>9} {'layout':>6} {'renames/s':>10} {'stats/s':>10}")
+    for count in map(int, args.counts.split(",")):
+        for label, (depth, width) in LAYOUTS.items():
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                renames, lookups = run(Path(tmp), count, depth, width)
+            print(f"{count:>9} {label:>6} {renames:>10.0f} {lookups:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compares the scandir walker against the old recursive `Path.iterdir` walker.
+
+Usage: python -m benchmarks.bench_walk [--files 1000000] [--shape tiny]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from benchmarks.treegen import make_tree
+from folderhide.utils import PathType, walk_files
+
+
+def recursive_get_all_files(dir: PathType, base_path: PathType):
+    working_dir = Path(dir)
+    files: List[str] = []
+    for d in working_dir.iterdir():
+        if d.is_dir():
+            files.extend(recursive_get_all_files(d, base_path))
+        else:
+            files.append(str(d.relative_to(base_path)))
+
+    return files
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>12}: {count} files in {elapsed:.3f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--shape", default="tiny", choices=["wide", "deep", "tiny"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        root = base / "tree"
+        print(f"Creating {args.files} files...")
+        make_tree(root, args.shape, args.files)
+
+        old = timed("iterdir", lambda: len(recursive_get_all_files(root, base)))
+        new = timed("scandir", lambda: sum(1 for _ in walk_files(root, base)))
+        print(f"Speedup: {old / new:.2f}x")
+
+        start = time.perf_counter()
+        next(walk_files(root, base))
+        first = time.perf_counter() - start
+        print(f"First path from scandir walker after {first * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Times every phase of hide and unhide on synthetic trees.
+
+For each shape from `benchmarks.treegen`, a tree is generated and then taken
+through the same steps as `folderhide.core`:
+
+    walk      scanning the folder
+    plan      generating the random names
+    kdf       deriving the config key
+    encrypt   encoding and encrypting the config in memory
+    write     writing the config to disk and fsync'ing it
+    move      moving every file into the hidden directory
+    unhide    a full `folderhide.core.unhide`
+
+Each phase records its wall time, the user and system CPU time spent (system
+time is a rough measure of how syscall-heavy it is) and, unless --no-memory
+is given, the peak memory allocated by Python as seen by tracemalloc.
+tracemalloc slows Python code down, so compare runs made with the same flags.
+
+Results are written as JSON with --output. With --baseline, every phase is
+compared against an earlier result file and the exit status is 1 if any phase
+got slower by more than --tolerance.
+
+Usage: python -m benchmarks.suite [--shapes wide,deep,tiny,huge] [--files N]
+           [--output results.json] [--baseline baseline.json]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.treegen import SHAPES, make_tree
+from folderhide import __version__
+from folderhide.config import ConfigWriter
+from folderhide.core import unhide
+from folderhide.mover import Move, move_files
+from folderhide.progress import Progress
+from folderhide.utils import (
+    Layout,
+    derive_key,
+    new_kdf_params,
+    plan_files,
+    random_str,
+    scan_files,
+)
+
+PASSWORD = "benchmark"
+
+# Phases faster than this are too noisy to be flagged as regressions.
+MIN_REGRESSION = 0.01
+
+
+class Recorder:
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.phases: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.memory:
+            tracemalloc.reset_peak()
+        times = os.times()
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        after = os.times()
+
+        result = {
+            "wall": wall,
+            "user": after.user - times.user,
+            "system": after.system - times.system,
+        }
+        if self.memory:
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        self.phases[name] = result
+
+
+def _quiet(_: str):
+    pass
+
+
+def run_shape(base: Path, shape: str, files: int, file_size: int, memory: bool):
+    folder = base / shape
+    folder.mkdir()
+    total_bytes = make_tree(folder, shape, files, file_size)
+    config = base / "cfg.enc"
+    recorder = Recorder(memory)
+
+    with recorder.phase("walk"):
+        scanned = list(scan_files(folder, base))
+
+    layout = Layout("." + random_str(8))
+    with recorder.phase("plan"):
+        plan = list(plan_files((path for path, _ in scanned), layout))
+
+    kdf = new_kdf_params()
+    with recorder.phase("kdf"):
+        key = derive_key(PASSWORD, kdf)
+
+    with recorder.phase("encrypt"):
+        buffer = io.BytesIO()
+        writer = ConfigWriter(buffer, key, kdf, layout)
+        for cfg in plan:
+            writer.add(cfg)
+        writer.finish()
+
+    with recorder.phase("write"):
+        with open(config, "wb") as f:
+            f.write(buffer.getbuffer())
+            os.fsync(f.fileno())
+
+    with recorder.phase("move"):
+        moves = (
+            Move(i, str(base / cfg.original), str(base / cfg.modified), size)
+            for i, (cfg, (_, size)) in enumerate(zip(plan, scanned))
+        )
+        move_files(moves, Progress())
+
+    with recorder.phase("unhide"):
+        unhide(PASSWORD, str(config), _quiet, _quiet, print)
+
+    return {
+        "files": len(scanned),
+        "bytes": total_bytes,
+        "config_bytes": len(buffer.getbuffer()),
+        "phases": recorder.phases,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions: List[str] = []
+    for shape, result in results["shapes"].items():
+        old_shape = baseline.get("shapes", {}).get(shape)
+        if old_shape is None:
+            continue
+
+        for phase, numbers in result["phases"].items():
+            old = old_shape["phases"].get(phase)
+            if old is None:
+                continue
+
+            new_wall, old_wall = numbers["wall"], old["wall"]
+            change = (new_wall - old_wall) / old_wall if old_wall else 0.0
+            flag = ""
+            if new_wall - old_wall > MIN_REGRESSION and change > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{shape}/{phase}")
+            print(
+                f"{shape:>5} {phase:>8}: {old_wall:8.3f}s -> {new_wall:8.3f}s "
+                f"({change:+.0%}){flag}"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--huge-files", type=int, default=4)
+    parser.add_argument("--file-size", type=int, default=64 << 20)
+    parser.add_argument("--dir", help="Folder to run in, defaults to the temp dir.")
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    memory = not args.no_memory
+    if memory:
+        tracemalloc.start()
+
+    results = {
+        "version": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "memory": memory,
+        "shapes": {},
+    }
+    for shape in args.shapes.split(","):
+        files = args.huge_files if shape == "huge" else args.files
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            result = run_shape(Path(tmp), shape, files, args.file_size, memory)
+        results["shapes"][shape] = result
+
+        print(f"{shape}: {result['files']} files, {result['bytes']} bytes")
+        for phase, numbers in result["phases"].items():
+            line = (
+                f"  {phase:>8}: {numbers['wall']:8.3f}s wall "
+                f"{numbers['user']:7.2f}s user {numbers['system']:7.2f}s sys"
+            )
+            if memory:
+                line += f" {numbers['peak_memory'] / 1024 / 1024:8.1f} MiB peak"
+            print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("memory") != memory:
+            print("Warning: baseline was recorded with different tracemalloc settings")
+
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic folder trees for the benchmarks.
+
+Shapes:
+    wide: a handful of directories with thousands of files each
+    deep: long chains of nested directories with a few files per level
+    tiny: many one-byte files, 100 per directory, three levels deep
+    huge: a few large files of `file_size` bytes
+"""
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Tuple
+
+CHUNK = b"\0" * (1024 * 1024)
+
+ShapeFunction = Callable[[int], Iterator[Tuple[str, str]]]
+
+
+def _wide(files: int):
+    for i in range(files):
+        yield f"dir{i % 8}", f"file{i}"
+
+
+def _deep(files: int, per_level: int = 4, max_depth: int = 64):
+    # Chains are restarted every max_depth levels to stay below PATH_MAX.
+    folder = ""
+    for i in range(files):
+        level = i // per_level
+        if i % per_level == 0:
+            if level % max_depth == 0:
+                folder = f"chain{level // max_depth}"
+            folder = os.path.join(folder, f"d{level % max_depth}")
+        yield folder, f"file{i}"
+
+
+def _tiny(files: int):
+    for i in range(files):
+        d = i // 100
+        yield os.path.join(f"a{d // 10000}", f"b{d // 100}", f"c{d}"), f"file{i}"
+
+
+def _huge(files: int):
+    for i in range(files):
+        yield "", f"file{i}"
+
+
+SHAPES: Dict[str, Tuple[ShapeFunction, int]] = {
+    "wide": (_wide, 1),
+    "deep": (_deep, 1),
+    "tiny": (_tiny, 1),
+    "huge": (_huge, -1),
+}
+
+
+def _write(path: Path, size: int):
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(CHUNK[:size])
+            size -= len(CHUNK)
+
+
+def make_tree(root: Path, shape: str, files: int, file_size: int = 64 << 20):
+    """Creates `files` files under `root` in the given shape.
+
+    Returns the number of bytes written.
+    """
+    paths, size = SHAPES[shape]
+    if size < 0:
+        size = file_size
+
+    total = 0
+    made = set()
+    for folder, name in paths(files):
+        if folder not in made:
+            (root / folder).mkdir(parents=True, exist_ok=True)
+            made.add(folder)
+        _write(root / folder / name, size)
+        total += size
+
+    return total
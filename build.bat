@@ -10,6 +10,7 @@ pyinstaller run.py  --noconfirm --log-level=WARN ^
     --onefile ^
     --name "folderhide" ^
     --console ^
+    --exclude-module PyQt6 ^
     --icon "NONE" ^
     --workpath ./build/cli ^
     --distpath ./dist/
\ No newline at end of file
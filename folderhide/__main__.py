@@ -0,0 +1,20 @@
+"""Entry point of `python -m folderhide` and of the `folderhide` script.
+
+Only the CLI is imported from here, never the GUI or PyQt6.
+"""
+import sys
+
+from folderhide.cli import cli
+
+
+def main():
+    if getattr(sys, "frozen", False):
+        # Process pools of a pyinstaller build start by running this again.
+        from multiprocessing import freeze_support
+
+        freeze_support()
+    cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""asyncio interface to `folderhide.core`.
+
+Every function starts the matching core function on a worker thread and
+returns an `Operation` right away:
+
+    op = aio.hide("folder", "password", "cfg.enc", jobs=4)
+    async for update in op:
+        print(update.phase, update.files_done, update.files_total)
+    stats = await op
+
+The walk, key derivation and moves run exactly as in the sync functions,
+with `jobs` moves at a time, and at most `max_workers` operations of an
+`executor` run at once. Cancelling the task awaiting an operation, or calling
+`Operation.cancel`, stops it once the file being moved is done. Nothing is
+left half moved: like after a crash, the journal is kept and `resume`
+finishes the operation.
+
+Messages go to the "folderhide" logger.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor
+from typing import Any, Callable, Generator, Generic, Optional, Sequence, TypeVar
+
+from folderhide import core
+from folderhide.progress import ProgressUpdate
+from folderhide.stats import Stats
+from folderhide.utils import DEFAULT_KDF_COST
+from folderhide.verify import VerifyReport
+
+logger = logging.getLogger("folderhide")
+
+T = TypeVar("T")
+
+
+class Operation(Generic[T]):
+    """A core operation running on a worker thread.
+
+    Iterating over it yields its progress updates until it finishes, and
+    awaiting it returns the result of the core function, its `Stats` for
+    most of them.
+    """
+
+    def __init__(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+        executor: Optional[Executor] = None,
+        **kwargs: Any,
+    ):
+        loop = asyncio.get_running_loop()
+        self._cancel = threading.Event()
+        self._updates: "asyncio.Queue[Optional[ProgressUpdate]]" = asyncio.Queue()
+
+        def on_progress(update: ProgressUpdate):
+            loop.call_soon_threadsafe(self._updates.put_nowait, update)
+
+        def run() -> T:
+            return func(
+                *args,
+                logger.info,
+                logger.debug,
+                logger.error,
+                on_progress,
+                cancel=self._cancel,
+                **kwargs,
+            )
+
+        self._future: "asyncio.Future[T]" = loop.run_in_executor(executor, run)
+        self._future.add_done_callback(lambda _: self._updates.put_nowait(None))
+
+    def cancel(self):
+        """Asks the operation to stop after the file it is moving."""
+        self._cancel.set()
+
+    def done(self):
+        return self._future.done()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            update = await self._updates.get()
+        except asyncio.CancelledError:
+            await self._stop()
+            raise
+
+        if update is None:
+            # Let other iterators, and later ones, see the end as well.
+            self._updates.put_nowait(None)
+            raise StopAsyncIteration
+        return update
+
+    async def _stop(self):
+        # The worker thread can't be interrupted, so wait for it to stop at a
+        # consistent point before giving up.
+        self.cancel()
+        await asyncio.shield(self._future)
+
+    async def wait(self) -> T:
+        try:
+            return await asyncio.shield(self._future)
+        except asyncio.CancelledError:
+            await self._stop()
+            raise
+
+    def __await__(self) -> Generator[Any, None, T]:
+        return self.wait().__await__()
+
+
+def hide(
+    folder: str,
+    password: str,
+    output: str,
+    jobs: int = 1,
+    shard_depth: int = 0,
+    shard_width: int = 1,
+    kdf_cost: int = DEFAULT_KDF_COST,
+    encrypt_contents: bool = False,
+    digests: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    whole_dirs: int = 0,
+    pack_below: int = 0,
+    executor: Optional[Executor] = None,
+) -> Operation[Stats]:
+    return Operation(
+        core.hide,
+        folder,
+        password,
+        output,
+        jobs=jobs,
+        shard_depth=shard_depth,
+        shard_width=shard_width,
+        kdf_cost=kdf_cost,
+        encrypt_contents=encrypt_contents,
+        digests=digests,
+        include=include,
+        exclude=exclude,
+        whole_dirs=whole_dirs,
+        pack_below=pack_below,
+        executor=executor,
+    )
+
+
+def append(
+    folder: str,
+    password: str,
+    config: str,
+    jobs: int = 1,
+    executor: Optional[Executor] = None,
+) -> Operation[Stats]:
+    return Operation(
+        core.append, folder, password, config, jobs=jobs, executor=executor
+    )
+
+
+def unhide(
+    password: str,
+    config: str,
+    jobs: int = 1,
+    only: str = "",
+    executor: Optional[Executor] = None,
+) -> Operation[Stats]:
+    return Operation(
+        core.unhide, password, config, jobs=jobs, only=only, executor=executor
+    )
+
+
+def resume(
+    password: str,
+    config: str,
+    jobs: int = 1,
+    executor: Optional[Executor] = None,
+) -> Operation[Stats]:
+    return Operation(core.resume, password, config, jobs=jobs, executor=executor)
+
+
+def verify(
+    password: str,
+    config: str,
+    jobs: int = 1,
+    check_digests: bool = False,
+    executor: Optional[Executor] = None,
+) -> Operation[Optional[VerifyReport]]:
+    """Awaiting the operation returns a `VerifyReport`, or None if the check
+    could not be done."""
+    return Operation(
+        core.verify,
+        password,
+        config,
+        jobs=jobs,
+        check_digests=check_digests,
+        executor=executor,
+    )
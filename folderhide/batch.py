@@ -0,0 +1,220 @@
+"""Hiding and unhiding many folders at once.
+
+Folders, or configs, are spread over a process pool and each one is handled
+by the same `folderhide.core` functions as a single hide or unhide.
+
+A batch hide derives one key for the whole batch: all of its configs share
+the same KDF parameters and salt. A batch unhide reads the parameters of
+every config first; a key shared by several configs is derived once up front
+and handed to the workers, the others are derived by the worker itself.
+"""
+
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+from folderhide import core
+from folderhide.config import read_kdf_params
+from folderhide.journal import OP_HIDE, OP_UNHIDE
+from folderhide.stats import Stats
+from folderhide.utils import (
+    DEFAULT_KDF_COST,
+    KDFParams,
+    derive_key,
+    new_kdf_params,
+)
+
+CONFIG_SUFFIX = ".enc"
+
+
+class BatchResult(NamedTuple):
+    target: str
+    stats: Stats
+    errors: List[str]
+
+    @property
+    def ok(self):
+        return self.stats.completed and not self.errors
+
+
+ResultFunction = Callable[[BatchResult], None]
+
+
+def config_for(folder: str):
+    """Returns where a batch hide writes the config of `folder`."""
+    return os.path.normpath(folder) + CONFIG_SUFFIX
+
+
+def _quiet(_: str):
+    pass
+
+
+def _hide_one(
+    folder: str,
+    password: str,
+    kdf: KDFParams,
+    key: bytes,
+    jobs: int,
+    shard_depth: int,
+    shard_width: int,
+    encrypt_contents: bool,
+    digests: bool,
+    include: Sequence[str],
+    exclude: Sequence[str],
+    whole_dirs: int,
+    pack_below: int,
+):
+    errors: List[str] = []
+    stats = Stats(OP_HIDE)
+    try:
+        stats = core.hide(
+            folder,
+            password,
+            config_for(folder),
+            _quiet,
+            _quiet,
+            errors.append,
+            jobs=jobs,
+            shard_depth=shard_depth,
+            shard_width=shard_width,
+            kdf=kdf,
+            key=key,
+            encrypt_contents=encrypt_contents,
+            digests=digests,
+            include=include,
+            exclude=exclude,
+            whole_dirs=whole_dirs,
+            pack_below=pack_below,
+        )
+    except Exception as e:
+        errors.append(type(e).__name__ + ": " + str(e))
+        stats.finish(False)
+
+    return BatchResult(folder, stats, errors)
+
+
+def _unhide_one(config: str, password: str, key: Optional[bytes], jobs: int):
+    errors: List[str] = []
+    stats = Stats(OP_UNHIDE)
+    try:
+        stats = core.unhide(
+            password, config, _quiet, _quiet, errors.append, jobs=jobs, key=key
+        )
+    except Exception as e:
+        errors.append(type(e).__name__ + ": " + str(e))
+        stats.finish(False)
+
+    return BatchResult(config, stats, errors)
+
+
+def _failed(target: str, error: str, operation: str):
+    return BatchResult(target, Stats(operation).finish(False), [error])
+
+
+def _run(
+    tasks: Dict[str, tuple],
+    func: Callable[..., BatchResult],
+    workers: Optional[int],
+    on_result: Optional[ResultFunction],
+    results: List[BatchResult],
+):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, target, *args) for target, args in tasks.items()]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+def batch_hide(
+    folders: Iterable[str],
+    password: str,
+    workers: Optional[int] = None,
+    jobs: int = 1,
+    shard_depth: int = 0,
+    shard_width: int = 1,
+    kdf_cost: int = DEFAULT_KDF_COST,
+    encrypt_contents: bool = False,
+    digests: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    whole_dirs: int = 0,
+    pack_below: int = 0,
+    on_result: Optional[ResultFunction] = None,
+):
+    """Hides every folder, each with its config next to it (see `config_for`).
+
+    Returns a `BatchResult` per folder, in the order they finished. A folder
+    given again, under any name, is only hidden once; the others fail.
+    """
+    results: List[BatchResult] = []
+    tasks: Dict[str, tuple] = {}
+    seen: Set[str] = set()
+    kdf = new_kdf_params(kdf_cost)
+    key = derive_key(password, kdf)
+    for folder in folders:
+        if not os.path.isdir(folder):
+            results.append(_failed(folder, "Not a folder.", OP_HIDE))
+        elif os.path.realpath(folder) in seen or config_for(folder) in seen:
+            results.append(_failed(folder, "Folder given twice.", OP_HIDE))
+        elif os.path.exists(config_for(folder)):
+            error = "Config " + config_for(folder) + " already exists."
+            results.append(_failed(folder, error, OP_HIDE))
+        else:
+            seen.update((os.path.realpath(folder), config_for(folder)))
+            tasks[folder] = (
+                password,
+                kdf,
+                key,
+                jobs,
+                shard_depth,
+                shard_width,
+                encrypt_contents,
+                digests,
+                include,
+                exclude,
+                whole_dirs,
+                pack_below,
+            )
+
+    if on_result:
+        for result in results:
+            on_result(result)
+
+    return _run(tasks, _hide_one, workers, on_result, results)
+
+
+def batch_unhide(
+    configs: Iterable[str],
+    password: str,
+    workers: Optional[int] = None,
+    jobs: int = 1,
+    on_result: Optional[ResultFunction] = None,
+):
+    """Unhides the folder of every config.
+
+    Returns a `BatchResult` per config, in the order they finished.
+    """
+    results: List[BatchResult] = []
+    params: Dict[str, KDFParams] = {}
+    for config in configs:
+        try:
+            with open(config, "rb") as f:
+                params[config] = read_kdf_params(f)
+        except OSError as e:
+            results.append(_failed(config, e.strerror or str(e), OP_UNHIDE))
+        except ValueError as e:
+            results.append(_failed(config, str(e), OP_UNHIDE))
+
+    if on_result:
+        for result in results:
+            on_result(result)
+
+    uses = Counter(params.values())
+    keys = {kdf: derive_key(password, kdf) for kdf, count in uses.items() if count > 1}
+    tasks = {config: (password, keys.get(kdf), jobs) for config, kdf in params.items()}
+    return _run(tasks, _unhide_one, workers, on_result, results)
@@ -1,20 +1,224 @@
+import time
+from typing import TYPE_CHECKING, List, Optional, TextIO, Tuple
+
 import click
 
-from folderhide.core import hide as hide_core
-from folderhide.core import unhide as unhide_core
 from folderhide.cli.utils import debug, error, info
+from folderhide.utils import (
+    DEFAULT_KDF_COST,
+    LEAF_DIRS,
+    MAX_KDF_COST,
+    MIN_KDF_COST,
+    NAME_SIZE,
+    calibrate_kdf,
+    shards_fit,
+)
 from folderhide.typing import CLIContext
-from tqdm import tqdm
 
-pbar = None
+# The core, batch and tqdm modules are imported by the commands that use them
+# to keep the start up of every command, and of --help, short.
+if TYPE_CHECKING:
+    from folderhide.batch import BatchResult
+    from folderhide.progress import ProgressUpdate
+    from tqdm import tqdm
+
+pbar: Optional["tqdm"] = None
+
+KDF_TIME_BUDGET = 0.5
+
+MiB = 1024 * 1024
+
+
+def parse_kdf_cost(ctx: click.Context, param: click.Parameter, value: str):
+    if value == "auto":
+        cost = calibrate_kdf(KDF_TIME_BUDGET)
+        info("Calibrated KDF cost: " + str(cost))
+        return cost
+
+    try:
+        cost = int(value)
+    except ValueError:
+        raise click.BadParameter("must be a number or 'auto'")
+
+    if not MIN_KDF_COST <= cost <= MAX_KDF_COST:
+        raise click.BadParameter(
+            f"must be between {MIN_KDF_COST} and {MAX_KDF_COST}, or 'auto'"
+        )
+    return cost
+
+
+def parse_whole_dirs(ctx: click.Context, param: click.Parameter, value: str):
+    if value is None:
+        return 0
+    if value == "leaf":
+        return LEAF_DIRS
+
+    try:
+        depth = int(value)
+    except ValueError:
+        raise click.BadParameter("must be a number or 'leaf'")
+
+    if depth < 1:
+        raise click.BadParameter("must be at least 1, or 'leaf'")
+    return depth
+
+
+def parse_size(ctx: click.Context, param: click.Parameter, value: str):
+    if value is None:
+        return 0
+
+    units = {"K": 1024, "M": 1024 * 1024}
+    number, unit = value, 1
+    if value[-1:].upper() in units:
+        number, unit = value[:-1], units[value[-1].upper()]
+    try:
+        size = int(number) * unit
+    except ValueError:
+        raise click.BadParameter("must be a number of bytes, like 4096 or 64K")
+
+    if size < 1:
+        raise click.BadParameter("must be at least 1 byte")
+    return size
+
+
+def check_whole_dirs(whole_dirs: int, encrypt_contents: bool, digests: bool):
+    if whole_dirs and (encrypt_contents or digests):
+        raise click.UsageError(
+            "--whole-dirs can't be used with --encrypt-contents or --hash."
+        )
+
+
+def check_shards(shard_depth: int, shard_width: int):
+    if not shards_fit(shard_depth, shard_width):
+        raise click.UsageError(
+            f"--shard-depth times --shard-width must be less than {NAME_SIZE}."
+        )
 
 
-def on_progress(current: int, total: int):
+def check_pack_below(pack_below: int, encrypt_contents: bool, digests: bool):
+    if pack_below and (encrypt_contents or digests):
+        raise click.UsageError(
+            "--pack-below can't be used with --encrypt-contents or --hash."
+        )
+
+
+# Options of hide and batch-hide, passed on to `folderhide.core.hide`.
+HIDE_OPTIONS = [
+    click.option(
+        "--shard-depth",
+        default=0,
+        help="Spread hidden files over this many levels of subdirectories.",
+        type=click.IntRange(min=0, max=8),
+    ),
+    click.option(
+        "--shard-width",
+        default=1,
+        help="Characters of the random name used per subdirectory level.",
+        type=click.IntRange(min=1, max=4),
+    ),
+    click.option(
+        "--kdf-cost",
+        default=str(DEFAULT_KDF_COST),
+        help="scrypt cost as log2(N), or 'auto' to fit a key derivation "
+        f"in about {KDF_TIME_BUDGET} seconds on this machine.",
+        callback=parse_kdf_cost,
+    ),
+    click.option(
+        "--encrypt-contents",
+        is_flag=True,
+        default=False,
+        help="Also encrypt the contents of the files while hiding them. "
+        "They are decrypted again on unhide.",
+    ),
+    click.option(
+        "--hash",
+        "digests",
+        is_flag=True,
+        default=False,
+        help="Record a digest of every file, so that verify --hash can check "
+        "their contents.",
+    ),
+    click.option(
+        "--include",
+        multiple=True,
+        help="Only hide the files matching this rule. A rule without '/', like "
+        "'*.jpg', matches names at any depth; others, like 'photos/2020', match "
+        "paths relative to the folder. Can be repeated.",
+    ),
+    click.option(
+        "--exclude",
+        multiple=True,
+        help="Don't hide, or even look into, what matches this rule, like '.git' "
+        "or 'build/cache'. A rule ending with '/' only matches directories. "
+        "Wins over --include. Can be repeated.",
+    ),
+    click.option(
+        "--whole-dirs",
+        default=None,
+        help="Move the directories this many levels below the folder, or every "
+        "directory without subdirectories with 'leaf', as a whole instead of "
+        "file by file. Only the directories get random names: the names and "
+        "layout of everything inside them stay visible in the hidden folder.",
+        callback=parse_whole_dirs,
+    ),
+    click.option(
+        "--pack-below",
+        default=None,
+        help="Put the files smaller than this size, like 64K, in a few large pack "
+        "files instead of moving them one by one. Packed files come back with "
+        "default permissions and the current time.",
+        callback=parse_size,
+    ),
+]
+
+
+def hide_options(command):
+    for option in reversed(HIDE_OPTIONS):
+        command = option(command)
+    return command
+
+
+def read_targets(args: Tuple[str, ...], source: Optional[TextIO]):
+    targets = list(args)
+    if source is not None:
+        targets.extend(line.strip() for line in source if line.strip())
+    if not targets:
+        raise click.UsageError("Nothing to do, give paths or --from.")
+    return targets
+
+
+def report(results: List["BatchResult"], done: str, kind: str, start: float):
+    succeeded = [r for r in results if r.ok]
+    files = sum(r.stats.files_moved for r in succeeded)
+    nbytes = sum(r.stats.bytes_moved for r in succeeded)
+    info(
+        f"{done} {len(succeeded)} of {len(results)} {kind}: {files} files, "
+        f"{nbytes / MiB:.1f} MiB in {time.perf_counter() - start:.1f}s"
+    )
+    for result in results:
+        if not result.ok:
+            error(result.target + ": " + "; ".join(result.errors or ["failed"]))
+
+
+def on_progress(update: "ProgressUpdate"):
     global pbar
-    if pbar is None:
-        pbar = tqdm(total=total)
+    if pbar is None or pbar.desc != update.phase:
+        from tqdm import tqdm
+
+        if pbar is not None:
+            pbar.close()
+        pbar = tqdm(total=update.files_total or None, desc=update.phase, unit="file")
 
-    pbar.update(current)
+    if update.bytes_total:
+        pbar.set_postfix_str(
+            f"{update.bytes_done / MiB:.1f}/{update.bytes_total / MiB:.1f} MiB",
+            refresh=False,
+        )
+    pbar.update(update.files_done - pbar.n)
+
+    if update.files_total and update.files_done >= update.files_total:
+        pbar.close()
+        pbar = None
 
 
 @click.group()
@@ -40,6 +244,8 @@ def cli(ctx: CLIContext, dbg: bool):
 @click.option(
     "--output-file",
     "-o",
+    "--config",
+    "-c",
     "output",
     default="cfg.enc",
     help="The output data path. This file tells the program how to unhide your folder.",
@@ -49,14 +255,105 @@ def cli(ctx: CLIContext, dbg: bool):
         dir_okay=False,
     ),
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of files to move concurrently.",
+    type=click.IntRange(min=1),
+)
+@hide_options
+@click.option(
+    "--append",
+    is_flag=True,
+    default=False,
+    help="Only hide the files that are not in the config yet, and add them to it. "
+    "The config keeps its own layout and KDF settings.",
+)
+@click.option(
+    "--stats",
+    "stats_file",
+    default=None,
+    help="Write timings and counters of the run to this file as JSON.",
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
 @click.pass_context
-def hide(ctx: CLIContext, folder: str, password: str, output: str):
+def hide(
+    ctx: CLIContext,
+    folder: str,
+    password: str,
+    output: str,
+    jobs: int,
+    shard_depth: int,
+    shard_width: int,
+    kdf_cost: int,
+    encrypt_contents: bool,
+    digests: bool,
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+    whole_dirs: int,
+    pack_below: int,
+    append: bool,
+    stats_file: Optional[str],
+):
     def on_debug(x: str):
         if ctx.obj["debug"]:
             debug(x)
 
+    from folderhide.core import append as append_core
+    from folderhide.core import hide as hide_core
+
     print(folder)
-    hide_core(folder, password, output, info, on_debug, error, on_progress)
+    check_whole_dirs(whole_dirs, encrypt_contents, digests)
+    check_pack_below(pack_below, encrypt_contents, digests)
+    check_shards(shard_depth, shard_width)
+    if append:
+        if include or exclude:
+            raise click.UsageError(
+                "--append uses the include and exclude rules of the config."
+            )
+        if whole_dirs or pack_below:
+            raise click.UsageError("--append hides new files one by one.")
+        if encrypt_contents or digests:
+            raise click.UsageError(
+                "--append encrypts and hashes the new files like the config says."
+            )
+        if shard_depth or shard_width != 1 or kdf_cost != DEFAULT_KDF_COST:
+            raise click.UsageError(
+                "--append uses the layout and KDF settings of the config."
+            )
+        stats = append_core(
+            folder, password, output, info, on_debug, error, on_progress, jobs
+        )
+        if stats_file:
+            stats.write(stats_file)
+        return
+
+    stats = hide_core(
+        folder,
+        password,
+        output,
+        info,
+        on_debug,
+        error,
+        on_progress,
+        jobs,
+        shard_depth,
+        shard_width,
+        kdf_cost,
+        encrypt_contents=encrypt_contents,
+        digests=digests,
+        include=include,
+        exclude=exclude,
+        whole_dirs=whole_dirs,
+        pack_below=pack_below,
+    )
+    if stats_file:
+        stats.write(stats_file)
 
 
 @cli.command(name="unhide", help="Unhide the folder from config.")
@@ -72,10 +369,281 @@ def hide(ctx: CLIContext, folder: str, password: str, output: str):
         dir_okay=False,
     ),
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of files to move concurrently.",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--stats",
+    "stats_file",
+    default=None,
+    help="Write timings and counters of the run to this file as JSON.",
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.option(
+    "--only",
+    default="",
+    help="Only unhide the files whose path matches this glob, "
+    "e.g. 'folder/photos/*'. The rest stays hidden.",
+)
 @click.pass_context
-def unhide(ctx: CLIContext, password: str, config: str):
+def unhide(
+    ctx: CLIContext,
+    password: str,
+    config: str,
+    jobs: int,
+    stats_file: Optional[str],
+    only: str,
+):
     def on_debug(x: str):
         if ctx.obj["debug"]:
             debug(x)
 
-    unhide_core(password, config, info, on_debug, error, on_progress)
+    from folderhide.core import unhide as unhide_core
+
+    stats = unhide_core(
+        password, config, info, on_debug, error, on_progress, jobs, only
+    )
+    if stats_file:
+        stats.write(stats_file)
+
+
+@cli.command(name="resume", help="Finish a hide or unhide that was interrupted.")
+@click.argument("password")
+@click.option(
+    "--config",
+    "-c",
+    help="Config of the interrupted operation.",
+    default="cfg.enc",
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of files to move concurrently.",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--stats",
+    "stats_file",
+    default=None,
+    help="Write timings and counters of the run to this file as JSON.",
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.pass_context
+def resume(
+    ctx: CLIContext,
+    password: str,
+    config: str,
+    jobs: int,
+    stats_file: Optional[str],
+):
+    def on_debug(x: str):
+        if ctx.obj["debug"]:
+            debug(x)
+
+    from folderhide.core import resume as resume_core
+
+    stats = resume_core(password, config, info, on_debug, error, on_progress, jobs)
+    if stats_file:
+        stats.write(stats_file)
+
+
+@cli.command(name="verify", help="Check that every hidden file is in place.")
+@click.argument("password")
+@click.option(
+    "--config",
+    "-c",
+    help="Config to check.",
+    default="cfg.enc",
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=8,
+    help="Number of files to check concurrently.",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--hash",
+    "check_digests",
+    is_flag=True,
+    default=False,
+    help="Also compare the contents of every file with the digest recorded by "
+    "hide --hash.",
+)
+@click.pass_context
+def verify(ctx: CLIContext, password: str, config: str, jobs: int, check_digests: bool):
+    from folderhide.core import verify as verify_core
+
+    def on_debug(x: str):
+        if ctx.obj["debug"]:
+            debug(x)
+
+    report = verify_core(
+        password, config, info, on_debug, error, on_progress, jobs, check_digests
+    )
+    if report is None or not report.ok:
+        ctx.exit(1)
+
+
+@cli.command(name="ls", help="List the hidden files whose path starts with PREFIX.")
+@click.argument("password")
+@click.argument("prefix", default="")
+@click.option(
+    "--config",
+    "-c",
+    help="Config to load from.",
+    default="cfg.enc",
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.pass_context
+def ls(ctx: CLIContext, password: str, prefix: str, config: str):
+    def on_debug(x: str):
+        if ctx.obj["debug"]:
+            debug(x)
+
+    from folderhide.core import list_files
+
+    list_files(password, config, prefix, click.echo, on_debug, error)
+
+
+@cli.command(
+    name="batch-hide",
+    help="Hide many folders, each to FOLDER.enc. The key is derived once for "
+    "the whole batch.",
+)
+@click.argument("password")
+@click.argument("folders", nargs=-1)
+@click.option(
+    "--from",
+    "source",
+    default=None,
+    help="Read more folders from this file, one per line. Use - for stdin.",
+    type=click.File("r"),
+)
+@click.option(
+    "--workers",
+    "-w",
+    default=None,
+    help="Number of folders to hide at once. Defaults to the number of CPUs.",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of files to move concurrently in each folder.",
+    type=click.IntRange(min=1),
+)
+@hide_options
+def hide_many(
+    password: str,
+    folders: Tuple[str, ...],
+    source: Optional[TextIO],
+    workers: Optional[int],
+    jobs: int,
+    shard_depth: int,
+    shard_width: int,
+    kdf_cost: int,
+    encrypt_contents: bool,
+    digests: bool,
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+    whole_dirs: int,
+    pack_below: int,
+):
+    from folderhide.batch import batch_hide
+    from tqdm import tqdm
+
+    check_whole_dirs(whole_dirs, encrypt_contents, digests)
+    check_pack_below(pack_below, encrypt_contents, digests)
+    check_shards(shard_depth, shard_width)
+    targets = read_targets(folders, source)
+    start = time.perf_counter()
+    with tqdm(total=len(targets), desc="folders", unit="folder") as bar:
+        results = batch_hide(
+            targets,
+            password,
+            workers,
+            jobs,
+            shard_depth,
+            shard_width,
+            kdf_cost,
+            encrypt_contents,
+            digests,
+            include,
+            exclude,
+            whole_dirs,
+            pack_below,
+            on_result=lambda _: bar.update(),
+        )
+    report(results, "Hidden", "folders", start)
+
+
+@cli.command(name="batch-unhide", help="Unhide the folders of many configs.")
+@click.argument("password")
+@click.argument("configs", nargs=-1)
+@click.option(
+    "--from",
+    "source",
+    default=None,
+    help="Read more configs from this file, one per line. Use - for stdin.",
+    type=click.File("r"),
+)
+@click.option(
+    "--workers",
+    "-w",
+    default=None,
+    help="Number of folders to unhide at once. Defaults to the number of CPUs.",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    help="Number of files to move concurrently in each folder.",
+    type=click.IntRange(min=1),
+)
+def unhide_many(
+    password: str,
+    configs: Tuple[str, ...],
+    source: Optional[TextIO],
+    workers: Optional[int],
+    jobs: int,
+):
+    from folderhide.batch import batch_unhide
+    from tqdm import tqdm
+
+    targets = read_targets(configs, source)
+    start = time.perf_counter()
+    with tqdm(total=len(targets), desc="configs", unit="config") as bar:
+        results = batch_unhide(
+            targets, password, workers, jobs, on_result=lambda _: bar.update()
+        )
+    report(results, "Unhidden", "configs", start)
@@ -1,10 +1,9 @@
-import shutil
 from pathlib import Path
-from typing import List, Union
+from typing import Union
 
 import click
 
-from folderhide.utils import FileMetadata
+from folderhide import utils
 
 PathType = Union[str, Path]
 
@@ -27,12 +26,4 @@ def move_file(src: PathType, dest: PathType, dbg: bool):
         debug("  - Source: " + str(src))
         debug("  - Target: " + str(dest))
 
-    target_path = Path(dest)
-    target_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(src, dest)
-
-
-def revert(datas: List[FileMetadata], dbg: bool = False):
-    info("Reverting files")
-    for dest, src in datas:
-        move_file(src, dest, dbg)
+    utils.move_file(src, dest)
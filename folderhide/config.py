@@ -0,0 +1,675 @@
+"""Reading and writing of encrypted config files.
+
+A config starts with a short header followed by a series of chunks:
+
+    header: MAGIC, version (1 byte), scrypt log2(N), r, p (1 byte each), salt
+    chunk:  kind (1 byte), length (4 bytes), nonce (16), tag (16), ciphertext
+
+Each DATA chunk holds up to `CHUNK_SIZE` entries and is encrypted and
+authenticated on its own, with the header, chunk kind and chunk number as
+associated data. The file always ends with a fixed-size END chunk
+holding the number of entries and data chunks, so a reader can learn the
+total up front and detect truncated or reordered files.
+
+Since version 3, entries in a DATA chunk are stored as a zlib-compressed
+binary table (see `encode_entries`): every directory used by the chunk is
+stored once and each path refers to it by index. Version 2 stored a JSON list.
+
+Since version 4, a META chunk right after the header records the `Layout` of
+the hidden files as JSON, and DATA chunks only store the random name of each
+hidden file; its full path is rebuilt from the layout. When the contents of
+the files are encrypted (see `folderhide.contents`), the META chunk also has
+`"encrypted": true`.
+
+Since version 5, the header records the scrypt parameters and a random salt
+for the config. Older versions were all derived with the default `KDFParams`.
+
+Since version 6, an INDEX chunk before the END chunk maps every directory of
+the original paths to the DATA chunks holding its files, and records where
+each chunk starts (see `ConfigIndex`). The END chunk also stores the offset of
+the INDEX chunk, so entries under a path can be read without decrypting the
+rest of the config. Updates are appended: `ConfigAppender` writes new chunks,
+a new INDEX and a new END after the old ones, and the chunks it replaced are
+simply no longer referenced.
+
+Since version 7, DATA chunks also store the size of every file and, for
+configs hidden with digests (`"digests": true` in the META chunk), the digest
+of its contents (see `folderhide.digest`).
+
+Since version 8, the META chunk can hold the `"include"` and `"exclude"`
+rules the folder was walked with (see `PathFilter`), so that later appends
+pick the same files.
+
+An original path ending with a separator is a whole directory, hidden with
+a single rename (see `scan_units`). It has no size.
+
+Since version 9, DATA chunks also store where every file is in its pack file,
+for configs hidden with some files packed (see `folderhide.pack`), and the
+INDEX chunk lists every pack file the config ever used. Packs emptied by
+unhiding part of the files stay listed, so the last unhide can remove them.
+
+Configs written before this format (nonce, tag and ciphertext of a single JSON
+list) are still readable.
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import islice, repeat
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from folderhide.utils import (
+    MAX_KDF_COST,
+    MIN_KDF_COST,
+    FileMetadata,
+    KDFParams,
+    Layout,
+    PathFilter,
+    derive_key,
+    get_cipher,
+)
+
+MAGIC = b"FHCF"
+VERSION = 9
+SALT_SIZE = 16
+
+CHUNK_DATA = 0
+CHUNK_END = 1
+CHUNK_META = 2
+CHUNK_INDEX = 3
+
+CHUNK_SIZE = 4096
+
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+# scrypt needs 128 * r * 2 ** log_n bytes and p times the work. The header
+# isn't authenticated before the key is derived, so its parameters are kept
+# within what `hide` can write.
+MAX_KDF_R = 8
+MAX_KDF_P = 4
+
+COMPRESSION_LEVEL = 1
+
+_kdf_params = struct.Struct(">BBB")
+_chunk_header = struct.Struct(">BI")
+_chunk_number = struct.Struct(">Q")
+_end_payload = struct.Struct(">QQQ")
+_end_payload_v5 = struct.Struct(">QQ")
+_count = struct.Struct(">I")
+
+END_CHUNK_SIZE = _chunk_header.size + NONCE_SIZE + TAG_SIZE + _end_payload.size
+END_CHUNK_SIZE_V5 = _chunk_header.size + NONCE_SIZE + TAG_SIZE + _end_payload_v5.size
+
+
+def _associated_data(header: bytes, kind: int, number: int = 0):
+    return header + bytes([kind]) + _chunk_number.pack(number)
+
+
+def _encode_str(s: str):
+    return s.encode("utf-8", "surrogatepass")
+
+
+def _decode_str(b: bytes):
+    return b.decode("utf-8", "surrogatepass")
+
+
+def _pack_array(values: array):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes):
+    values = array(typecode, data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _pack_sections(sections: List[bytes]):
+    parts = []
+    for section in sections:
+        parts.append(_count.pack(len(section)))
+        parts.append(section)
+
+    return zlib.compress(b"".join(parts), COMPRESSION_LEVEL)
+
+
+def _unpack_sections(payload: bytes):
+    data = zlib.decompress(payload)
+
+    sections: List[bytes] = []
+    offset = 0
+    while offset < len(data):
+        (length,) = _count.unpack_from(data, offset)
+        offset += _count.size
+        sections.append(data[offset : offset + length])
+        offset += length
+
+    return sections
+
+
+def dir_key(path: str):
+    """Returns the directory part of `path`, with its trailing separator."""
+    return path[: path.rfind(os.sep) + 1]
+
+
+def encode_entries(entries: List[FileMetadata]) -> bytes:
+    """Packs entries into the compressed binary chunk payload.
+
+    Each path is split into its directory and name. Every directory is stored
+    once and referenced by index. The payload is made of six sections:
+
+        directory indices: u32 array, two per entry (original, modified)
+        directories: NUL-separated, UTF-8
+        names: NUL-separated, UTF-8, two per entry
+        sizes: i64 array, one per entry
+        digests: one per entry, or empty if any entry has none
+        offsets: i64 array, one per entry (-1 if not packed), or empty if no
+            entry is packed
+
+    Each section is preceded by its length (u32), and the whole payload is
+    compressed with zlib. Versions before 7 only have the first three, and
+    version 7 and 8 the first five.
+    """
+    dirs: Dict[str, int] = {}
+    indices = array("I")
+    names: List[str] = []
+    sizes = array("q")
+    offsets = array("q")
+    for entry in entries:
+        for path in (entry.original, entry.modified):
+            parent, _, name = path.rpartition(os.sep)
+            index = dirs.get(parent)
+            if index is None:
+                index = dirs[parent] = len(dirs)
+            indices.append(index)
+            names.append(name)
+        sizes.append(entry.size)
+        offsets.append(entry.offset)
+
+    digests = b""
+    if all(entry.digest for entry in entries):
+        digests = b"".join(entry.digest for entry in entries)
+
+    return _pack_sections(
+        [
+            _pack_array(indices),
+            _encode_str("\0".join(dirs)),
+            _encode_str("\0".join(names)),
+            _pack_array(sizes),
+            digests,
+            _pack_array(offsets) if any(o >= 0 for o in offsets) else b"",
+        ]
+    )
+
+
+def decode_entries(payload: bytes) -> List[FileMetadata]:
+    sections = _unpack_sections(payload)
+    indices = _unpack_array("I", sections[0])
+    prefixes = [d + os.sep if d else "" for d in _decode_str(sections[1]).split("\0")]
+    paths = [
+        prefixes[index] + name
+        for index, name in zip(indices, _decode_str(sections[2]).split("\0"))
+    ]
+    entries = [FileMetadata(*x) for x in zip(paths[::2], paths[1::2])]
+    if len(sections) < 5:
+        return entries
+
+    sizes = _unpack_array("q", sections[3])
+    digests: Iterable[bytes] = repeat(b"")
+    if sections[4]:
+        digest_size = len(sections[4]) // len(entries)
+        digests = [
+            sections[4][i : i + digest_size]
+            for i in range(0, len(sections[4]), digest_size)
+        ]
+    offsets: Iterable[int] = repeat(-1)
+    if len(sections) > 5 and sections[5]:
+        offsets = _unpack_array("q", sections[5])
+
+    return [
+        FileMetadata(entry.original, entry.modified, size, digest, offset)
+        for entry, size, digest, offset in zip(entries, sizes, digests, offsets)
+    ]
+
+
+def _decode_json_entries(payload: bytes) -> List[FileMetadata]:
+    return [FileMetadata(*x) for x in json.loads(payload.decode())]
+
+
+_decoders: Dict[int, Callable[[bytes], List[FileMetadata]]] = {
+    2: _decode_json_entries,
+    3: decode_entries,
+    4: decode_entries,
+    5: decode_entries,
+    6: decode_entries,
+    7: decode_entries,
+    8: decode_entries,
+    VERSION: decode_entries,
+}
+
+
+class ConfigIndex:
+    """Where the DATA chunks of a config are, and which directories they hold.
+
+    `offsets` has the file offset of every chunk number ever written, with 0
+    for chunks that were replaced. `chunks` maps each directory (as returned
+    by `dir_key`) to the numbers of the chunks with files directly in it.
+
+    `packs` has the random names of the pack files, used by the chunks still
+    referenced or not.
+
+    Encoded as five sections like `encode_entries`: the offsets (u64), the
+    directories sorted and NUL-separated, the number of chunks of each
+    directory (u32), the chunk numbers themselves (u32) and the pack names
+    sorted and NUL-separated. Versions 6 to 8 have no pack names.
+    """
+
+    def __init__(self):
+        self.offsets = array("Q")
+        self.chunks: Dict[str, List[int]] = {}
+        self.packs: Set[str] = set()
+        self._sorted: Optional[List[str]] = None
+
+    def copy(self):
+        index = ConfigIndex()
+        index.offsets = array("Q", self.offsets)
+        index.chunks = {key: list(numbers) for key, numbers in self.chunks.items()}
+        index.packs = set(self.packs)
+        return index
+
+    def add(self, key: str, number: int):
+        numbers = self.chunks.get(key)
+        if numbers is None:
+            self.chunks[key] = [number]
+            self._sorted = None
+        elif numbers[-1] != number:
+            numbers.append(number)
+
+    def drop(self, number: int):
+        # Stale references are filtered out when looking up and encoding.
+        self.offsets[number] = 0
+
+    def live(self):
+        return [number for number, offset in enumerate(self.offsets) if offset]
+
+    def lookup(self, prefix: str) -> List[int]:
+        """Returns the chunks that can hold paths starting with `prefix`."""
+        if self._sorted is None:
+            self._sorted = sorted(self.chunks)
+
+        # Directories under the prefix are next to each other once sorted.
+        keys = []
+        for key in islice(self._sorted, bisect_left(self._sorted, prefix), None):
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+
+        # So can the directory the prefix ends in, with names that continue it.
+        keys.append(dir_key(prefix))
+
+        return self.find(keys)
+
+    def find(self, keys: Iterable[str]) -> List[int]:
+        """Returns the chunks with files directly in any of the directories."""
+        numbers: Set[int] = set()
+        for key in keys:
+            numbers.update(self.chunks.get(key, ()))
+        return sorted(n for n in numbers if self.offsets[n])
+
+    def encode(self) -> bytes:
+        keys: List[str] = []
+        counts = array("I")
+        numbers = array("I")
+        for key in sorted(self.chunks):
+            live = [n for n in self.chunks[key] if self.offsets[n]]
+            if live:
+                keys.append(key)
+                counts.append(len(live))
+                numbers.extend(live)
+
+        return _pack_sections(
+            [
+                _pack_array(self.offsets),
+                _encode_str("\0".join(keys)),
+                _pack_array(counts),
+                _pack_array(numbers),
+                _encode_str("\0".join(sorted(self.packs))),
+            ]
+        )
+
+    @classmethod
+    def decode(cls, payload: bytes):
+        sections = _unpack_sections(payload)
+        index = cls()
+        index.offsets = _unpack_array("Q", sections[0])
+        counts = _unpack_array("I", sections[2])
+        numbers = _unpack_array("I", sections[3]).tolist()
+
+        keys = _decode_str(sections[1]).split("\0") if counts else []
+        start = 0
+        for key, count in zip(keys, counts):
+            index.chunks[key] = numbers[start : start + count]
+            start += count
+
+        index._sorted = keys
+        if len(sections) > 4 and sections[4]:
+            index.packs = set(_decode_str(sections[4]).split("\0"))
+        return index
+
+
+def _make_header(kdf: KDFParams):
+    return MAGIC + bytes([VERSION]) + _kdf_params.pack(*kdf[:3]) + kdf.salt
+
+
+class ConfigWriter:
+    def __init__(
+        self,
+        f: BinaryIO,
+        key: bytes,
+        kdf: KDFParams,
+        layout: Layout,
+        chunk_size: int = CHUNK_SIZE,
+        encrypted: bool = False,
+        digests: bool = False,
+        path_filter: Optional[PathFilter] = None,
+    ):
+        self._start(f, key, _make_header(kdf), ConfigIndex(), chunk_size)
+        f.write(self._header)
+        meta = layout._asdict()
+        if encrypted:
+            meta["encrypted"] = True
+        if digests:
+            meta["digests"] = True
+        if path_filter:
+            meta["include"] = path_filter.include
+            meta["exclude"] = path_filter.exclude
+        self._write_chunk(CHUNK_META, json.dumps(meta).encode())
+
+    def _start(
+        self,
+        f: BinaryIO,
+        key: bytes,
+        header: bytes,
+        index: ConfigIndex,
+        chunk_size: int,
+    ):
+        self._f = f
+        self._key = key
+        self._header = header
+        self._index = index
+        self._chunk_size = chunk_size
+        self._pending: List[FileMetadata] = []
+        self.total = 0
+
+    def _write_chunk(self, kind: int, payload: bytes, number: int = 0):
+        """Writes a chunk and returns its offset."""
+        offset = self._f.tell()
+        cipher = get_cipher(self._key)
+        cipher.update(_associated_data(self._header, kind, number))
+        text, tag = cipher.encrypt_and_digest(payload)
+        self._f.write(_chunk_header.pack(kind, len(text)))
+        self._f.write(cipher.nonce)
+        self._f.write(tag)
+        self._f.write(text)
+        return offset
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        payload = encode_entries(self._pending)
+        number = len(self._index.offsets)
+        self._index.offsets.append(self._write_chunk(CHUNK_DATA, payload, number))
+        for entry in self._pending:
+            self._index.add(dir_key(entry.original), number)
+            if entry.offset >= 0:
+                self._index.packs.add(entry.modified)
+        self._pending = []
+
+    def add(self, entry: FileMetadata):
+        # The layout rebuilds the rest of the hidden path from the name.
+        self._pending.append(entry._replace(modified=os.path.basename(entry.modified)))
+        self.total += 1
+        if len(self._pending) >= self._chunk_size:
+            self._flush()
+
+    def finish(self):
+        self._flush()
+        index_offset = self._write_chunk(CHUNK_INDEX, self._index.encode())
+        end = _end_payload.pack(self.total, len(self._index.offsets), index_offset)
+        self._write_chunk(CHUNK_END, end)
+        self._f.flush()
+
+
+class ConfigAppender(ConfigWriter):
+    """Adds entries to, and drops chunks from, an indexed config.
+
+    `f` is the config `reader` was opened on, opened for writing as well.
+    Nothing already in the file is overwritten until `finish` has written the
+    new END chunk; `rollback` cuts off whatever was appended before that.
+    """
+
+    def __init__(
+        self,
+        f: BinaryIO,
+        reader: "ConfigReader",
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        if reader.index is None:
+            raise ValueError("Config has no index")
+
+        self._start(f, reader._key, reader._header, reader.index.copy(), chunk_size)
+        self.total = reader.total
+        self.first_chunk = len(self._index.offsets)
+        self._size = f.seek(0, 2)
+
+    def drop(self, number: int, count: int):
+        """Stops referencing DATA chunk `number`, which held `count` entries."""
+        self._index.drop(number)
+        self.total -= count
+
+    def _write_chunk(self, kind: int, payload: bytes, number: int = 0):
+        # The reader shares the file and may have moved away from its end.
+        self._f.seek(0, 2)
+        return super()._write_chunk(kind, payload, number)
+
+    def rollback(self):
+        self._f.seek(self._size)
+        self._f.truncate()
+        self._f.flush()
+
+
+def _unpack_kdf(header: bytes):
+    """Returns the key derivation parameters of a version 5+ header.
+
+    Raises a `ValueError` if they are out of bounds.
+    """
+    if len(header) < len(MAGIC) + 1 + _kdf_params.size + SALT_SIZE:
+        raise ValueError("Config is truncated")
+
+    log_n, r, p = _kdf_params.unpack_from(header, len(MAGIC) + 1)
+    if not (
+        MIN_KDF_COST <= log_n <= MAX_KDF_COST
+        and 1 <= r <= MAX_KDF_R
+        and 1 <= p <= MAX_KDF_P
+    ):
+        raise ValueError("Config has invalid key derivation parameters")
+    return KDFParams(log_n, r, p, header[-SALT_SIZE:])
+
+
+def read_kdf_params(f: BinaryIO):
+    """Returns the key derivation parameters of a config without decrypting it."""
+    size = len(MAGIC) + 1 + _kdf_params.size + SALT_SIZE
+    header = f.read(size)
+    f.seek(0)
+    if len(header) < size or header[: len(MAGIC)] != MAGIC or header[len(MAGIC)] < 5:
+        return KDFParams()
+    return _unpack_kdf(header)
+
+
+class ConfigReader:
+    """Reads the entries of a config file.
+
+    The password is checked when the reader is created, and a `ValueError` is
+    raised if it is wrong or the config is damaged. Entries are decrypted one
+    chunk at a time while iterating.
+
+    `key` skips the key derivation when it was already derived from the
+    password and the parameters returned by `read_kdf_params`.
+    """
+
+    def __init__(self, f: BinaryIO, password: str, key: Optional[bytes] = None):
+        self._f = f
+        self._legacy: List[FileMetadata] = []
+        self.layout: Optional[Layout] = None
+        self.index: Optional[ConfigIndex] = None
+        self.encrypted = False
+        self.digests = False
+        self.path_filter = PathFilter()
+        self.kdf = KDFParams()
+
+        self.version = 1
+        header = f.read(len(MAGIC) + 1)
+        if header[: len(MAGIC)] == MAGIC and header[-1] in _decoders:
+            self.version = header[-1]
+            if self.version >= 5:
+                header += f.read(_kdf_params.size + SALT_SIZE)
+                self.kdf = _unpack_kdf(header)
+
+            self._header = header
+            self._derive_key(password, key)
+            self._read_end()
+            self._read_meta()
+        else:
+            self._derive_key(password, key)
+            self._read_legacy()
+
+    def _derive_key(self, password: str, key: Optional[bytes]):
+        start = time.perf_counter()
+        self._key = key or derive_key(password, self.kdf)
+        self.kdf_time = time.perf_counter() - start
+
+    @property
+    def key(self):
+        return self._key
+
+    def _read_legacy(self):
+        self._f.seek(0)
+        nonce, tag, ciphertext = [self._f.read(x) for x in (16, 16, -1)]
+        cipher = get_cipher(self._key, nonce=nonce)
+        text_data = cipher.decrypt_and_verify(ciphertext, tag)
+        self._legacy = [FileMetadata(*x) for x in json.loads(text_data.decode())]
+        self.total = len(self._legacy)
+
+    def _read_chunk(self, number: int = 0):
+        header = self._f.read(_chunk_header.size)
+        if len(header) < _chunk_header.size:
+            raise ValueError("Config is truncated")
+
+        kind, length = _chunk_header.unpack(header)
+        nonce, tag, text = [self._f.read(x) for x in (NONCE_SIZE, TAG_SIZE, length)]
+        if len(text) < length:
+            raise ValueError("Config is truncated")
+
+        cipher = get_cipher(self._key, nonce=nonce)
+        cipher.update(_associated_data(self._header, kind, number))
+        return kind, cipher.decrypt_and_verify(text, tag)
+
+    def _read_end(self):
+        size = END_CHUNK_SIZE if self.version >= 6 else END_CHUNK_SIZE_V5
+        if self._f.seek(0, 2) < len(self._header) + size:
+            raise ValueError("Config is truncated")
+
+        self._f.seek(-size, 2)
+        kind, payload = self._read_chunk()
+        if kind != CHUNK_END:
+            raise ValueError("Config is truncated")
+
+        if self.version < 6:
+            self.total, self._chunks = _end_payload_v5.unpack(payload)
+            return
+
+        self.total, self._chunks, index_offset = _end_payload.unpack(payload)
+        self._f.seek(index_offset)
+        kind, payload = self._read_chunk()
+        if kind != CHUNK_INDEX:
+            raise ValueError("Unexpected chunk in config")
+        self.index = ConfigIndex.decode(payload)
+
+    def _read_meta(self):
+        self._f.seek(len(self._header))
+        if self.version >= 4:
+            kind, payload = self._read_chunk()
+            if kind != CHUNK_META:
+                raise ValueError("Unexpected chunk in config")
+            meta = json.loads(payload.decode())
+            self.encrypted = meta.pop("encrypted", False)
+            self.digests = meta.pop("digests", False)
+            self.path_filter = PathFilter(
+                meta.pop("include", []), meta.pop("exclude", [])
+            )
+            self.layout = Layout(**meta)
+
+        self._data_start = self._f.tell()
+
+    def read_entries(self, number: int) -> List[FileMetadata]:
+        """Decrypts DATA chunk `number`.
+
+        Without an index, chunks can only be read in order.
+        """
+        if self.index is not None:
+            self._f.seek(self.index.offsets[number])
+
+        kind, payload = self._read_chunk(number)
+        if kind != CHUNK_DATA:
+            raise ValueError("Unexpected chunk in config")
+
+        entries = _decoders[self.version](payload)
+        if self.layout is None:
+            return entries
+
+        path = self.layout.path
+        return [entry._replace(modified=path(entry.modified)) for entry in entries]
+
+    def packs(self) -> List[str]:
+        """Returns the hidden paths of every pack file the config used."""
+        if self.index is None or self.layout is None:
+            return []
+        return [self.layout.path(name) for name in sorted(self.index.packs)]
+
+    def __iter__(self) -> Iterator[FileMetadata]:
+        if self.version == 1:
+            yield from self._legacy
+            return
+
+        self._f.seek(self._data_start)
+        chunks = self.index.live() if self.index else range(self._chunks)
+        for number in chunks:
+            yield from self.read_entries(number)
+
+    def select(self, prefix: str) -> Iterator[FileMetadata]:
+        """Yields the entries whose original path starts with `prefix`.
+
+        With an index, only the chunks that can hold such paths are read.
+        """
+        if self.index is None:
+            entries: Iterator[FileMetadata] = iter(self)
+        else:
+            entries = (
+                entry
+                for number in self.index.lookup(prefix)
+                for entry in self.read_entries(number)
+            )
+
+        for entry in entries:
+            if entry.original.startswith(prefix):
+                yield entry
@@ -0,0 +1,144 @@
+"""Encryption of file contents for `hide --encrypt-contents`.
+
+A file is encrypted in chunks of `CHUNK_SIZE` bytes with AES-EAX, each one
+followed by its tag:
+
+    chunk: ciphertext (up to CHUNK_SIZE bytes), tag (16)
+
+The nonce of a chunk is the hidden name of the file followed by the chunk
+number, so nothing has to be stored per file: hidden names are unique within
+a config. The last chunk is authenticated as the last one, which catches
+truncated files, and an empty file is a single empty chunk.
+
+The key is derived from the config key with HKDF, so that key is never used
+with both random and name-based nonces.
+
+Files are streamed through a fixed buffer. The result is written next to its
+destination and fsync'ed before it takes the destination's place and the
+source is removed, so an interrupted move never loses a file.
+"""
+import os
+import shutil
+import struct
+from typing import BinaryIO, NamedTuple, Protocol
+
+from folderhide.utils import get_cipher
+
+CHUNK_SIZE = 1 << 20
+TAG_SIZE = 16
+PART_SUFFIX = ".part"
+
+_chunk_number = struct.Struct(">Q")
+_LAST = b"\x01"
+_MORE = b"\x00"
+
+
+class _Source(Protocol):
+    """A file opened with `open(path, "rb")`, read into a buffer."""
+
+    def fileno(self) -> int:
+        ...
+
+    def readinto(self, buffer: memoryview) -> int:
+        ...
+
+
+class _Sink(Protocol):
+    """Where decrypted contents go: a file, or anything else with `write`."""
+
+    def write(self, data: memoryview) -> object:
+        ...
+
+
+class Crypt(NamedTuple):
+    key: bytes
+    decrypt: bool = False
+
+
+def content_key(config_key: bytes) -> bytes:
+    from Crypto.Hash import SHA256
+    from Crypto.Protocol.KDF import HKDF
+
+    return HKDF(config_key, 16, None, SHA256, context=b"folderhide contents")
+
+
+def _chunk_cipher(key: bytes, name: str, number: int, last: bool):
+    cipher = get_cipher(key, name.encode() + _chunk_number.pack(number))
+    cipher.update(_LAST if last else _MORE)
+    return cipher
+
+
+def _count_chunks(size: int, chunk_size: int):
+    return max(1, -(-size // chunk_size))
+
+
+def encrypted_size(size: int):
+    """Returns the size of a file of `size` bytes once encrypted."""
+    return size + TAG_SIZE * _count_chunks(size, CHUNK_SIZE)
+
+
+def encrypt_stream(key: bytes, name: str, src: _Source, dest: BinaryIO):
+    size = os.fstat(src.fileno()).st_size
+    chunks = _count_chunks(size, CHUNK_SIZE)
+    buffer = memoryview(bytearray(CHUNK_SIZE))
+    for number in range(chunks):
+        length = src.readinto(buffer)
+        if length != min(CHUNK_SIZE, size - number * CHUNK_SIZE):
+            raise OSError("File changed while it was being encrypted")
+
+        text = buffer[:length]
+        cipher = _chunk_cipher(key, name, number, number == chunks - 1)
+        _, tag = cipher.encrypt_and_digest(text, output=text)
+        dest.write(text)
+        dest.write(tag)
+
+
+def decrypt_stream(key: bytes, name: str, src: _Source, dest: _Sink):
+    size = os.fstat(src.fileno()).st_size
+    chunks = _count_chunks(size, CHUNK_SIZE + TAG_SIZE)
+    buffer = memoryview(bytearray(CHUNK_SIZE + TAG_SIZE))
+    for number in range(chunks):
+        length = src.readinto(buffer)
+        if length < TAG_SIZE:
+            raise ValueError("Encrypted file is truncated")
+
+        text = buffer[: length - TAG_SIZE]
+        cipher = _chunk_cipher(key, name, number, number == chunks - 1)
+        cipher.decrypt_and_verify(text, buffer[length - TAG_SIZE : length], text)
+        dest.write(text)
+
+
+def transfer(crypt: Crypt, resuming: bool, src: str, dest: str):
+    """Moves `src` to `dest`, encrypting or decrypting it on the way.
+
+    Returns False, like `DirectoryCache.move` for a file that was not copied
+    to another device, or None when resuming and the file was already moved.
+    """
+    if resuming and not os.path.lexists(src) and os.path.lexists(dest):
+        return None
+
+    # Links are moved as they are, there is nothing of theirs to encrypt.
+    if os.path.islink(src):
+        shutil.move(src, dest)
+        return False
+
+    name = os.path.basename(src if crypt.decrypt else dest)
+    stream = decrypt_stream if crypt.decrypt else encrypt_stream
+    part = dest + PART_SUFFIX
+    try:
+        with open(src, "rb") as fin, open(part, "wb") as fout:
+            try:
+                stream(crypt.key, name, fin, fout)
+            except ValueError:
+                raise ValueError(src + " failed authentication") from None
+            fout.flush()
+            os.fsync(fout.fileno())
+        shutil.copystat(src, part)
+        os.replace(part, dest)
+    except BaseException:
+        if os.path.lexists(part):
+            os.remove(part)
+        raise
+
+    os.remove(src)
+    return False
@@ -1,23 +1,217 @@
-import json
 import os
 import sys
+import threading
 import traceback
+from fnmatch import fnmatchcase
 from pathlib import Path
-from typing import Callable
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
-from folderhide.typing import MoveData
+from folderhide.config import ConfigAppender, ConfigReader, ConfigWriter, dir_key
+from folderhide.contents import Crypt, content_key
+from folderhide.digest import digest_files
+from folderhide.journal import (
+    OP_HIDE,
+    OP_UNHIDE,
+    Journal,
+    JournalHeader,
+    journal_path,
+)
+from folderhide.mover import Move, move_files
+from folderhide.pack import Packer, Packs, Unpacker
+from folderhide.progress import Cancelled, Progress, ProgressFunction
+from folderhide.stats import Stats
 from folderhide.utils import (
+    DEFAULT_KDF_COST,
+    NAME_SIZE,
     FileMetadata,
-    generate_config,
-    get_all_files,
-    get_crypto,
-    move_file,
+    KDFParams,
+    Layout,
+    PathFilter,
+    Plan,
+    derive_key,
+    glob_prefix,
+    new_kdf_params,
     random_str,
+    scan_files,
+    scan_units,
+    shards_fit,
 )
+from folderhide.verify import CHANGED, MISSING, Problem, VerifyReport, check_files
 
 LogFunction = Callable[[str], None]
 
 
+def _get_move(header: JournalHeader, index: int, cfg: FileMetadata):
+    # Whole directories end with a separator, which their moves don't keep.
+    original = os.path.join(header.original_root, cfg.original.rstrip(os.sep))
+    hidden = os.path.join(header.hidden_root, cfg.modified)
+    # The size of a packed file also tells how much of its pack to read back.
+    # Whole directories, and files of configs older than version 7, have none.
+    size = max(cfg.size, 0)
+    if header.operation == OP_HIDE:
+        return Move(index, original, hidden, size, cfg.offset)
+    return Move(index, hidden, original, size, cfg.offset)
+
+
+def _total_size(entries: Iterable[FileMetadata]):
+    return sum(max(cfg.size, 0) for cfg in entries)
+
+
+def _remaining_moves(
+    header: JournalHeader,
+    entries: Iterable[FileMetadata],
+    done: bytearray,
+    unpacker: Optional[Unpacker],
+):
+    for i, cfg in enumerate(entries):
+        if not done[i]:
+            yield _get_move(header, i, cfg)
+        elif unpacker is not None and cfg.offset >= 0:
+            unpacker.seen(str(Path(header.hidden_root) / cfg.modified))
+
+
+def _remove_packs(
+    header: JournalHeader,
+    reader: ConfigReader,
+    entries: Iterable[FileMetadata],
+    dirs: Set[str],
+):
+    """Removes every pack of the config, and of `entries`, once no file is
+    hidden in them anymore, recording the directories they were in."""
+    packs = set(reader.packs())
+    packs.update(cfg.modified for cfg in entries if cfg.offset >= 0)
+    for pack in packs:
+        path = Path(header.hidden_root) / pack
+        if path.exists():
+            os.remove(path)
+            dirs.add(os.path.dirname(pack))
+
+
+def _shard_dirs(entries: Iterable[FileMetadata], depth: int, dirs: Set[str]):
+    """Passes `entries` through, recording the shard directories they are
+    hidden in."""
+    for cfg in entries:
+        if depth:
+            dirs.add(os.path.dirname(cfg.modified))
+        yield cfg
+
+
+def _remove_shards(header: JournalHeader, dirs: Set[str], depth: int):
+    """Removes the shard directories in `dirs`, and their parents up to the
+    target directory, that are left empty."""
+    for d in dirs:
+        path = os.path.join(header.hidden_root, d)
+        for _ in range(depth):
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+            path = os.path.dirname(path)
+
+
+def _unfinished(config: str, error_func: LogFunction):
+    if journal_path(config).exists():
+        error_func("An unfinished operation was found for " + config + ".")
+        error_func("Run the resume command to finish it first.")
+        return True
+    return False
+
+
+def _select(reader: ConfigReader, pattern: str):
+    """Reads the entries matching `pattern` from the chunks that can hold them.
+
+    Also returns, for every chunk with a match, its number of entries and the
+    entries that do not match.
+    """
+    assert reader.index is not None
+    selected: List[FileMetadata] = []
+    kept: Dict[int, Tuple[int, List[FileMetadata]]] = {}
+    for number in reader.index.lookup(glob_prefix(pattern)):
+        entries = reader.read_entries(number)
+        matched: List[FileMetadata] = []
+        rest: List[FileMetadata] = []
+        for entry in entries:
+            if fnmatchcase(entry.original, pattern):
+                matched.append(entry)
+            else:
+                rest.append(entry)
+
+        if matched:
+            selected.extend(matched)
+            kept[number] = (len(entries), rest)
+
+    return selected, kept
+
+
+def _forget(
+    f: BinaryIO,
+    reader: ConfigReader,
+    kept: Dict[int, Tuple[int, List[FileMetadata]]],
+):
+    """Rewrites the chunks `_select` matched without the unhidden entries.
+
+    Returns the number of entries left in the config.
+    """
+    if not kept:
+        return reader.total
+
+    appender = ConfigAppender(f, reader)
+    try:
+        for number, (count, rest) in kept.items():
+            appender.drop(number, count)
+            for entry in rest:
+                appender.add(entry)
+        appender.finish()
+        os.fsync(f.fileno())
+    except BaseException:
+        appender.rollback()
+        raise
+
+    return appender.total
+
+
+def _appended(reader: ConfigReader, first_chunk: int):
+    assert reader.index is not None
+    return [
+        entry
+        for number in reader.index.live()
+        if number >= first_chunk
+        for entry in reader.read_entries(number)
+    ]
+
+
+def _add_digests(plan: Plan, root: Path, progress: Progress, jobs: int):
+    progress.start("hash", len(plan), sum(plan.sizes))
+    files = ((str(root / entry.original), entry.size) for entry in plan)
+    for entry, digest in zip(plan, digest_files(files, progress, jobs)):
+        if not digest:
+            raise OSError("Could not read " + entry.original)
+        plan.add_digest(digest)
+
+
+def _debug_filter(path_filter: PathFilter, debug_func: LogFunction):
+    if path_filter.include:
+        debug_func("Include: " + ", ".join(path_filter.include))
+    if path_filter.exclude:
+        debug_func("Exclude: " + ", ".join(path_filter.exclude))
+
+
+def _crypt(reader: ConfigReader, decrypt: bool):
+    if not reader.encrypted:
+        return None
+    return Crypt(content_key(reader.key), decrypt)
+
+
 def hide(
     folder: str,
     password: str,
@@ -25,11 +219,52 @@ def hide(
     info_func: LogFunction,
     debug_func: LogFunction,
     error_func: LogFunction,
-    progress_func: Callable[[int, int], None],
+    progress_func: Optional[ProgressFunction] = None,
+    jobs: int = 1,
+    shard_depth: int = 0,
+    shard_width: int = 1,
+    kdf_cost: int = DEFAULT_KDF_COST,
+    cancel: Optional[threading.Event] = None,
+    kdf: Optional[KDFParams] = None,
+    key: Optional[bytes] = None,
+    encrypt_contents: bool = False,
+    digests: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    whole_dirs: int = 0,
+    pack_below: int = 0,
 ):
+    """Hides `folder`, writing its config to `output`.
+
+    `kdf` and `key` let several configs share one key derivation. With
+    `encrypt_contents`, files are encrypted as they are moved. With `digests`,
+    a digest of every file is recorded for `verify`. `include` and `exclude`
+    rules (see `PathFilter`) are applied while walking the folder and kept in
+    the config. With `whole_dirs`, directories are moved as a whole instead
+    of file by file (see `scan_units`); only the directories get random names,
+    what is inside them keeps its names. Regular files smaller than
+    `pack_below` bytes are put in pack files (see `folderhide.pack`).
+    """
+    stats = Stats(OP_HIDE)
+    if _unfinished(output, error_func):
+        return stats.finish(False)
+
+    if whole_dirs and (encrypt_contents or digests):
+        error_func("Whole directories can't have their contents encrypted or hashed.")
+        return stats.finish(False)
+
+    if pack_below and (encrypt_contents or digests):
+        error_func("Packed files can't have their contents encrypted or hashed.")
+        return stats.finish(False)
+
+    if not shards_fit(shard_depth, shard_width):
+        error_func("Shards can use at most " + str(NAME_SIZE - 1) + " characters.")
+        return stats.finish(False)
+
+    progress = Progress(progress_func, cancel=cancel)
     base_folder = Path(folder).parent
-    files = get_all_files(folder, base_folder)
-    debug_func("Total files: " + str(len(files)))
+    path_filter = PathFilter(include, exclude)
+    _debug_filter(path_filter, debug_func)
 
     target_dir = Path("." + random_str(8))
     info_func("Target directory: " + str(target_dir))
@@ -40,32 +275,102 @@ def hide(
         info_func("WIN: Marking folder as hidden")
         ctypes.windll.kernel32.SetFileAttributesW(str(target_dir.resolve()), 0x2)
 
-    info_func("Generating paths")
-    output_datas = generate_config(files, target_dir)
+    layout = Layout(str(target_dir), shard_depth, shard_width)
+    if shard_depth:
+        debug_func("Shards: " + str(shard_depth) + " levels of " + str(shard_width))
 
-    cipher = get_crypto(password)
-    info_func("Encrypting config")
-    text, tag = cipher.encrypt_and_digest(json.dumps(output_datas).encode())
+    if kdf is None:
+        kdf = new_kdf_params(kdf_cost)
+    debug_func("KDF cost: " + str(kdf.log_n))
+    with stats.phase("kdf"):
+        if key is None:
+            key = derive_key(password, kdf)
+    stats.kdf_time = stats.phases["kdf"]
+    plan = Plan(layout)
 
-    info_func("Writing config")
-    with open(output, "wb") as f:
-        [f.write(x) for x in (cipher.nonce, tag, text)]
+    info_func("Generating paths and writing config")
+    progress.start("scan")
+    try:
+        # Never write over a config, which may be the only way back to a
+        # folder hidden before.
+        with stats.phase("scan"), open(output, "xb") as f:
+            writer = ConfigWriter(
+                f,
+                key,
+                kdf,
+                layout,
+                encrypted=encrypt_contents,
+                digests=digests,
+                path_filter=path_filter,
+            )
+            for path, size, regular in scan_units(
+                folder, base_folder, path_filter, whole_dirs
+            ):
+                progress.advance(1, max(size, 0))
+                cfg = plan.add(path, size, packed=regular and size < pack_below)
+                if not digests:
+                    writer.add(cfg)
+
+            # Digests are computed once every file is known, so that they
+            # can be spread over the jobs.
+            if digests:
+                _add_digests(plan, base_folder, progress, jobs)
+                for cfg in plan:
+                    writer.add(cfg)
+            writer.finish()
+            os.fsync(f.fileno())
+    except FileExistsError:
+        error_func("Config " + output + " already exists.")
+        return stats.finish(False)
+    except OSError as e:
+        # Nothing was moved yet, so the config, if it was created, isn't needed.
+        if os.path.exists(output):
+            os.remove(output)
+        error_func(str(e))
+        error_func("Nothing was hidden.")
+        return stats.finish(False)
+    except Cancelled:
+        os.remove(output)
+        info_func("Cancelled, nothing was hidden.")
+        return stats.finish(False)
+    progress.report()
+    debug_func("Total files: " + str(len(plan)))
 
     info_func("Hiding files")
     output_folder = Path(output).parent
     (output_folder / target_dir).mkdir(parents=True, exist_ok=True)
 
+    header = JournalHeader(
+        OP_HIDE, str(base_folder.resolve()), str(output_folder.resolve())
+    )
+    journal = Journal.create(journal_path(output), header)
+    progress.start("move", len(plan), sum(size for size in plan.sizes if size > 0))
     try:
-        total_length = len(output_datas)
-        for i, cfg in enumerate(output_datas):
-            move_file(base_folder / cfg.original, output_folder / cfg.modified)
-            progress_func(i, total_length)
+        with stats.phase("move"):
+            move_files(
+                (_get_move(header, i, cfg) for i, cfg in enumerate(plan)),
+                progress,
+                jobs,
+                journal,
+                stats=stats,
+                crypt=Crypt(content_key(key)) if encrypt_contents else None,
+                packs=Packer(jobs=jobs) if pack_below else None,
+            )
+
+    except Cancelled:
+        info_func("Cancelled. Run the resume command to continue where it stopped.")
+        return stats.finish(False)
 
     except Exception:
         error_func("An exception has occured.")
+        error_func("Run the resume command to continue where it stopped.")
         traceback.print_exc()
-        return
+        return stats.finish(False)
 
+    finally:
+        journal.close()
+
+    journal.remove()
     info_func("Done!")
     info_func("Config available at: " + output)
     info_func("Hidden folder: " + str(target_dir))
@@ -73,45 +378,474 @@ def hide(
         "Please keep this file safe. This file is important for the unhide process."
     )
     info_func("The file also needs to be in the same directory as the folder.")
+    return stats.finish()
 
 
-def unhide(
+def append(
+    folder: str,
     password: str,
     config: str,
     info_func: LogFunction,
     debug_func: LogFunction,
     error_func: LogFunction,
-    progress_func: Callable[[int, int], None],
+    progress_func: Optional[ProgressFunction] = None,
+    jobs: int = 1,
+    cancel: Optional[threading.Event] = None,
 ):
-    info_func("Reading config")
-    with open(config, "rb") as f:
-        nonce, tag, ciphertext = [f.read(x) for x in (16, 16, -1)]
-    cipher = get_crypto(password, nonce=nonce)
+    """Hides the files of `folder` that are not in `config` yet.
 
-    try:
-        info_func("Decrypting config")
-        text_data = cipher.decrypt_and_verify(ciphertext, tag)
-    except ValueError:
-        error_func("Wrong config password!")
-        return
+    The new entries are appended to the config, which keeps its layout, key
+    and include and exclude rules. Files that are already hidden under the
+    same path are skipped. `folder` must have the name of the folder the
+    config was hidden from.
+    """
+    stats = Stats("append")
+    if _unfinished(config, error_func):
+        return stats.finish(False)
+
+    if not os.path.exists(config):
+        error_func("Config " + config + " does not exist.")
+        return stats.finish(False)
+
+    progress = Progress(progress_func, cancel=cancel)
+    base_folder = Path(folder).parent
+    output_folder = Path(config).parent
+    with open(config, "r+b") as f:
+        try:
+            info_func("Decrypting config")
+            with stats.phase("read_config"):
+                reader = ConfigReader(f, password)
+        except ValueError:
+            error_func("Wrong config password!")
+            return stats.finish(False)
+
+        stats.kdf_time = reader.kdf_time
+        debug_func("Config version: " + str(reader.version))
+        if reader.index is None or reader.layout is None:
+            error_func("This config has no index, files can't be added to it.")
+            return stats.finish(False)
+
+        # Every original path starts with the name of the hidden folder.
+        if not reader.index.lookup(os.path.join(Path(folder).name, "")):
+            error_func(folder + " is not the folder hidden with " + config + ".")
+            return stats.finish(False)
+
+        info_func("Looking for new files")
+        _debug_filter(reader.path_filter, debug_func)
+        progress.start("scan")
+        with stats.phase("scan"):
+            found: List[Tuple[str, int]] = []
+            try:
+                for path, size in scan_files(folder, base_folder, reader.path_filter):
+                    found.append((path, size))
+                    progress.advance(1, size)
+            except Cancelled:
+                info_func("Cancelled, nothing was hidden.")
+                return stats.finish(False)
+            progress.report()
 
-    info_func("Loading config")
-    data: MoveData = json.loads(text_data.decode())
+            # Only the chunks of the directories that have files are read.
+            index = reader.index
+            hidden = {
+                entry.original
+                for number in index.find({dir_key(path) for path, _ in found})
+                for entry in reader.read_entries(number)
+            }
 
-    info_func("Unhiding files")
-    config_folder = Path(config).parent
+        new = [(path, size) for path, size in found if path not in hidden]
+        if len(new) < len(found):
+            error_func(
+                str(len(found) - len(new))
+                + " files are already hidden under the same path and were skipped."
+            )
+            for path, _ in found:
+                if path in hidden:
+                    debug_func("Skipped: " + path)
 
+        if not new:
+            info_func("No new files to hide.")
+            return stats.finish()
+
+        def taken(path: str):
+            return os.path.lexists(output_folder / path)
+
+        info_func("Adding " + str(len(new)) + " files to the config")
+        plan = Plan(reader.layout)
+        with stats.phase("write_config"):
+            appender = ConfigAppender(f, reader)
+            try:
+                for path, size in new:
+                    cfg = plan.add(path, size, taken)
+                    if not reader.digests:
+                        appender.add(cfg)
+
+                if reader.digests:
+                    _add_digests(plan, base_folder, progress, jobs)
+                    for cfg in plan:
+                        appender.add(cfg)
+                appender.finish()
+                os.fsync(f.fileno())
+            except OSError as e:
+                appender.rollback()
+                error_func(str(e))
+                error_func("Nothing was hidden.")
+                return stats.finish(False)
+            except BaseException:
+                appender.rollback()
+                raise
+
+    info_func("Hiding files")
+    header = JournalHeader(
+        OP_HIDE,
+        str(base_folder.resolve()),
+        str(output_folder.resolve()),
+        first_chunk=str(appender.first_chunk),
+    )
+    journal = Journal.create(journal_path(config), header)
+    progress.start("move", len(plan), sum(plan.sizes))
     try:
-        total_length = len(data)
-        for i, cfg in enumerate(data, 1):
-            cfg = FileMetadata(*cfg)
-            move_file(config_folder / cfg.modified, config_folder / cfg.original)
-            progress_func(i, total_length)
+        with stats.phase("move"):
+            move_files(
+                (_get_move(header, i, cfg) for i, cfg in enumerate(plan)),
+                progress,
+                jobs,
+                journal,
+                stats=stats,
+                crypt=_crypt(reader, decrypt=False),
+            )
+
+    except Cancelled:
+        info_func("Cancelled. Run the resume command to continue where it stopped.")
+        return stats.finish(False)
 
     except Exception:
-        error_func("An error has occured.")
+        error_func("An exception has occured.")
+        error_func("Run the resume command to continue where it stopped.")
         traceback.print_exc()
-        return
+        return stats.finish(False)
 
-    os.remove(config)
+    finally:
+        journal.close()
+
+    journal.remove()
+    info_func("Done!")
+    info_func("Files in the config: " + str(appender.total))
+    return stats.finish()
+
+
+def unhide(
+    password: str,
+    config: str,
+    info_func: LogFunction,
+    debug_func: LogFunction,
+    error_func: LogFunction,
+    progress_func: Optional[ProgressFunction] = None,
+    jobs: int = 1,
+    only: str = "",
+    cancel: Optional[threading.Event] = None,
+    key: Optional[bytes] = None,
+):
+    stats = Stats(OP_UNHIDE)
+    if _unfinished(config, error_func):
+        return stats.finish(False)
+
+    only = only.replace("/", os.sep)
+    info_func("Reading config")
+    config_folder = str(Path(config).parent.resolve())
+    with open(config, "r+b" if only else "rb") as f:
+        try:
+            info_func("Decrypting config")
+            with stats.phase("read_config"):
+                reader = ConfigReader(f, password, key)
+        except ValueError:
+            error_func("Wrong config password!")
+            return stats.finish(False)
+
+        stats.kdf_time = reader.kdf_time
+        debug_func("Config version: " + str(reader.version))
+        if only and reader.index is None:
+            error_func("This config has no index, it can only be unhidden in full.")
+            return stats.finish(False)
+
+        entries: Sequence[FileMetadata] = []
+        kept: Dict[int, Tuple[int, List[FileMetadata]]] = {}
+        total = reader.total
+        if only:
+            with stats.phase("select"):
+                entries, kept = _select(reader, only)
+            total = len(entries)
+            debug_func("Matching files: " + str(total))
+
+        info_func("Unhiding files")
+        header = JournalHeader(OP_UNHIDE, config_folder, config_folder, only)
+        journal = Journal.create(journal_path(config), header)
+        progress = Progress(progress_func, cancel=cancel)
+        # Finding the size of a full unhide reads the config twice, which is
+        # only worth it to report it.
+        size = _total_size(entries if only else reader) if progress_func else 0
+        progress.start("move", total, size)
+        left = 0
+        depth = reader.layout.depth if reader.layout else 0
+        shards: Set[str] = set()
+        try:
+            with stats.phase("move"):
+                move_files(
+                    (
+                        _get_move(header, i, cfg)
+                        for i, cfg in enumerate(
+                            _shard_dirs(entries if only else reader, depth, shards)
+                        )
+                    ),
+                    progress,
+                    jobs,
+                    journal,
+                    stats=stats,
+                    crypt=_crypt(reader, decrypt=True),
+                    packs=Unpacker(remove=not only, jobs=jobs),
+                )
+
+            if only:
+                with stats.phase("write_config"):
+                    left = _forget(f, reader, kept)
+            if not left:
+                # Packs emptied by earlier unhides of part of the files.
+                _remove_packs(header, reader, entries, shards)
+            _remove_shards(header, shards, depth)
+
+        except Cancelled:
+            info_func("Cancelled. Run the resume command to continue where it stopped.")
+            return stats.finish(False)
+
+        except Exception:
+            error_func("An error has occured.")
+            error_func("Run the resume command to continue where it stopped.")
+            traceback.print_exc()
+            return stats.finish(False)
+
+        finally:
+            journal.close()
+
+    if not left:
+        os.remove(config)
+    else:
+        info_func("Files still hidden: " + str(left))
+    journal.remove()
     info_func("Done!")
+    return stats.finish()
+
+
+def resume(
+    password: str,
+    config: str,
+    info_func: LogFunction,
+    debug_func: LogFunction,
+    error_func: LogFunction,
+    progress_func: Optional[ProgressFunction] = None,
+    jobs: int = 1,
+    cancel: Optional[threading.Event] = None,
+):
+    stats = Stats("resume")
+    if not journal_path(config).exists():
+        error_func("No unfinished operation was found for " + config + ".")
+        return stats.finish(False)
+
+    journal = Journal.open(journal_path(config))
+    header = journal.header
+    stats.operation = "resume " + header.operation
+    with open(config, "r+b" if header.only else "rb") as f:
+        try:
+            info_func("Decrypting config")
+            with stats.phase("read_config"):
+                reader = ConfigReader(f, password)
+        except ValueError:
+            error_func("Wrong config password!")
+            journal.close()
+            return stats.finish(False)
+
+        stats.kdf_time = reader.kdf_time
+        entries: Iterable[FileMetadata] = reader
+        kept: Dict[int, Tuple[int, List[FileMetadata]]] = {}
+        total = reader.total
+        if header.only:
+            debug_func("Only: " + header.only)
+            selected, kept = _select(reader, header.only)
+            entries, total = selected, len(selected)
+        elif header.first_chunk:
+            debug_func("Appended from chunk: " + header.first_chunk)
+            appended = _appended(reader, int(header.first_chunk))
+            entries, total = appended, len(appended)
+
+        done = bytearray(total)
+        for index in journal.completed():
+            # Past the end once the config was already updated.
+            if index < total:
+                done[index] = 1
+        remaining = total - sum(done)
+        debug_func("Moved before: " + str(total - remaining))
+
+        info_func("Resuming " + header.operation + ", files left: " + str(remaining))
+        progress = Progress(progress_func, cancel=cancel)
+        size = 0
+        if progress_func:
+            size = _total_size(cfg for i, cfg in enumerate(entries) if not done[i])
+        progress.start("move", remaining, size)
+        finished = header.operation == OP_UNHIDE
+        packs: Packs = Packer(resuming=True, jobs=jobs)
+        unpacker: Optional[Unpacker] = None
+        if header.operation == OP_UNHIDE:
+            packs = unpacker = Unpacker(
+                resuming=True, remove=not header.only, jobs=jobs
+            )
+        depth = 0
+        if header.operation == OP_UNHIDE and reader.layout:
+            depth = reader.layout.depth
+        shards: Set[str] = set()
+        try:
+            with stats.phase("move"):
+                move_files(
+                    _remaining_moves(
+                        header, _shard_dirs(entries, depth, shards), done, unpacker
+                    ),
+                    progress,
+                    jobs,
+                    journal,
+                    resuming=True,
+                    stats=stats,
+                    crypt=_crypt(reader, decrypt=header.operation == OP_UNHIDE),
+                    packs=packs,
+                )
+
+            if header.only:
+                with stats.phase("write_config"):
+                    finished = _forget(f, reader, kept) == 0
+            if finished:
+                _remove_packs(header, reader, entries if header.only else (), shards)
+            _remove_shards(header, shards, depth)
+
+        except Cancelled:
+            info_func("Cancelled. Run the resume command to continue where it stopped.")
+            return stats.finish(False)
+
+        except Exception:
+            error_func("An error has occured.")
+            traceback.print_exc()
+            return stats.finish(False)
+
+        finally:
+            journal.close()
+
+    if finished:
+        os.remove(config)
+    journal.remove()
+    info_func("Done!")
+    return stats.finish()
+
+
+def list_files(
+    password: str,
+    config: str,
+    prefix: str,
+    output_func: LogFunction,
+    debug_func: LogFunction,
+    error_func: LogFunction,
+):
+    with open(config, "rb") as f:
+        try:
+            reader = ConfigReader(f, password)
+        except ValueError:
+            error_func("Wrong config password!")
+            return
+
+        debug_func("Config version: " + str(reader.version))
+        # Chunks hold files in the order they were hidden, or appended.
+        entries = reader.select(prefix.replace("/", os.sep))
+        for path in sorted(entry.original for entry in entries):
+            output_func(path)
+
+
+def verify(
+    password: str,
+    config: str,
+    info_func: LogFunction,
+    debug_func: LogFunction,
+    error_func: LogFunction,
+    progress_func: Optional[ProgressFunction] = None,
+    jobs: int = 1,
+    check_digests: bool = False,
+    cancel: Optional[threading.Event] = None,
+) -> Optional[VerifyReport]:
+    """Checks that every hidden file of `config` is in place, without moving
+    anything.
+
+    Returns None if the check could not be done.
+    """
+    if _unfinished(config, error_func):
+        return None
+
+    progress = Progress(progress_func, cancel=cancel)
+    root = Path(config).parent
+    with open(config, "rb") as f:
+        try:
+            info_func("Decrypting config")
+            reader = ConfigReader(f, password)
+        except ValueError:
+            error_func("Wrong config password!")
+            return None
+
+        debug_func("Config version: " + str(reader.version))
+        if check_digests and not reader.digests:
+            error_func("This config has no digests, it was not hidden with --hash.")
+            return None
+        entries = list(reader)
+
+    info_func("Checking " + str(len(entries)) + " files")
+    try:
+        progress.start("verify", len(entries))
+        problems: List[Problem] = list(
+            check_files(entries, str(root), progress, jobs, reader.encrypted)
+        )
+        progress.report()
+
+        if check_digests:
+            info_func("Comparing digests")
+            failed = {problem.entry.modified for problem in problems}
+            present = [entry for entry in entries if entry.modified not in failed]
+            progress.start(
+                "hash", len(present), sum(max(entry.size, 0) for entry in present)
+            )
+            key = content_key(reader.key) if reader.encrypted else None
+            files = ((str(root / entry.modified), entry.size) for entry in present)
+            for entry, digest in zip(present, digest_files(files, progress, jobs, key)):
+                if digest != entry.digest:
+                    problems.append(Problem(entry, CHANGED))
+            progress.report()
+    except Cancelled:
+        info_func("Cancelled.")
+        return None
+
+    for problem in problems:
+        debug_func(problem.reason + ": " + problem.entry.modified)
+        error_func(problem.reason.capitalize() + ": " + problem.entry.original)
+
+    report = VerifyReport(
+        len(entries),
+        [p.entry.original for p in problems if p.reason == MISSING],
+        [p.entry.original for p in problems if p.reason == CHANGED],
+        sum(1 for entry in entries if entry.size < 0),
+    )
+    if report.unsized:
+        info_func(
+            str(report.unsized)
+            + " files were hidden before sizes were recorded, "
+            + "they were only checked for existence."
+        )
+    info_func(
+        "Checked "
+        + str(report.checked)
+        + " files: "
+        + str(len(report.missing))
+        + " missing, "
+        + str(len(report.changed))
+        + " changed."
+    )
+    return report
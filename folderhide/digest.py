@@ -0,0 +1,110 @@
+"""Content digests, recorded by `hide --hash` and checked by `verify --hash`.
+
+A digest is the BLAKE2b of the original contents of a file, or of its target
+for a symlink. Hidden files with encrypted contents are decrypted on the way,
+so their digests can be checked as well.
+
+Files are read through a large buffer, in batches spread over a process pool
+when there are several jobs.
+"""
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+from folderhide.contents import decrypt_stream
+from folderhide.progress import Progress
+from folderhide.utils import batched
+
+DIGEST_SIZE = 32
+BUFFER_SIZE = 1 << 20
+BATCH_SIZE = 256
+PENDING_BATCHES = 4
+
+
+class _HashWriter:
+    def __init__(self, digest):
+        self.write = digest.update
+
+
+def file_digest(
+    path: str, key: Optional[bytes] = None, buffer: Optional[memoryview] = None
+) -> bytes:
+    """Returns the digest of a file. `key` is the content key of a hidden
+    file with encrypted contents."""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    if os.path.islink(path):
+        digest.update(os.fsencode(os.readlink(path)))
+        return digest.digest()
+
+    with open(path, "rb") as f:
+        if key is not None:
+            decrypt_stream(key, os.path.basename(path), f, _HashWriter(digest))
+            return digest.digest()
+
+        if buffer is None:
+            buffer = memoryview(bytearray(BUFFER_SIZE))
+        while True:
+            length = f.readinto(buffer)
+            if not length:
+                break
+            digest.update(buffer[:length])
+
+    return digest.digest()
+
+
+def _digest_batch(key: Optional[bytes], paths: List[str]):
+    # One buffer per batch. A file that can't be read, or fails
+    # authentication, gets an empty digest.
+    buffer = memoryview(bytearray(BUFFER_SIZE))
+    digests: List[bytes] = []
+    for path in paths:
+        try:
+            digests.append(file_digest(path, key, buffer))
+        except (OSError, ValueError):
+            digests.append(b"")
+    return digests
+
+
+def digest_files(
+    files: Iterable[Tuple[str, int]],
+    progress: Progress,
+    jobs: int = 1,
+    key: Optional[bytes] = None,
+) -> Iterator[bytes]:
+    """Yields the digest of every (path, size) in `files`, in order.
+
+    Unreadable files get an empty digest. With several jobs, up to
+    `PENDING_BATCHES` batches per job are read ahead.
+    """
+    digest = partial(_digest_batch, key)
+
+    def done(batch: List[Tuple[str, int]], digests: List[bytes]):
+        progress.advance(len(batch), sum(max(size, 0) for _, size in batch))
+        return digests
+
+    if jobs <= 1:
+        for batch in batched(files, BATCH_SIZE):
+            yield from done(batch, digest([path for path, _ in batch]))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    pending: Deque[Tuple[List[Tuple[str, int]], Future]] = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        try:
+            for batch in batched(files, BATCH_SIZE):
+                future = pool.submit(digest, [path for path, _ in batch])
+                pending.append((batch, future))
+                if len(pending) >= jobs * PENDING_BATCHES:
+                    batch, future = pending.popleft()
+                    yield from done(batch, future.result())
+
+            while pending:
+                batch, future = pending.popleft()
+                yield from done(batch, future.result())
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -1,3 +1,6 @@
+import argparse
+from typing import Optional
+
 from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget
 
 from folderhide.gui.hide import Hide
@@ -5,11 +8,11 @@ from folderhide.gui.unhide import Unhide
 
 
 class Main(QMainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, logFile: Optional[str] = None):
         super().__init__(parent)
 
-        self.hideWidget = Hide()
-        self.unhideWidget = Unhide()
+        self.hideWidget = Hide(logFile=logFile)
+        self.unhideWidget = Unhide(logFile=logFile)
 
         self.tabWidget = QTabWidget()
         self.tabWidget.addTab(self.hideWidget, "Hide")
@@ -21,7 +24,11 @@ class Main(QMainWindow):
 
 
 def run(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-file", help="Also append the whole log to this file.")
+    options, _ = parser.parse_known_args(args[1:])
+
     app = QApplication(args)
-    win = Main()
+    win = Main(logFile=options.log_file)
     win.show()
     app.exec()
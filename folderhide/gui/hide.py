@@ -1,6 +1,7 @@
 import os
 from typing import Optional
 
+from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import (
     QDialogButtonBox,
     QFileDialog,
@@ -9,12 +10,13 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QMessageBox,
     QProgressBar,
+    QPlainTextEdit,
     QPushButton,
-    QTextEdit,
     QVBoxLayout,
     QWidget,
 )
 
+from folderhide.gui.log import LogSink
 from folderhide.gui.utils import PasswordBar
 from folderhide.gui.workers import HideThread
 
@@ -32,8 +34,9 @@ class Hide(QWidget):
     targetPath: Optional[str] = None
     workingThread: Optional[HideThread] = None
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, logFile: Optional[str] = None):
         super().__init__(parent)
+        self.logFile = logFile
 
         self.progressBar = QProgressBar()
         self.progressBar.setTextVisible(False)
@@ -81,7 +84,11 @@ class Hide(QWidget):
         self.workingThread = HideThread(self.targetFolder, password, self.targetPath)
         self.workingThread.total.connect(self.progressBar.setMaximum)
         self.workingThread.progress.connect(self.progressBar.setValue)
-        self.workingThread.log.connect(self.logArea.append)
+        # Called on the worker thread, the sink batches lines for the view.
+        self.workingThread.log.connect(
+            self.logSink.write, Qt.ConnectionType.DirectConnection
+        )
+        self.workingThread.finished.connect(self.logSink.flush)
         self.workingThread.start()
 
     def _setFolder(self):
@@ -122,7 +129,7 @@ class Hide(QWidget):
         self.folderPathWidget.setText("")
         self.configPathWidget.setText("")
         self.passwordBar.setText("")
-        self.logArea.setText("")
+        self.logSink.clear()
 
     def createConfigRow(self):
         self.configWidgetLabel = QLabel("Config output")
@@ -142,8 +149,9 @@ class Hide(QWidget):
         self.buttonArea.addButton(resetButton, QDialogButtonBox.ButtonRole.ResetRole)
 
     def createLogArea(self):
-        self.logArea = QTextEdit()
+        self.logArea = QPlainTextEdit()
         self.logArea.setReadOnly(True)
+        self.logSink = LogSink(self.logArea, spillPath=self.logFile, parent=self)
 
     def createPasswordRow(self):
         self.passwordLabel = QLabel("Password")
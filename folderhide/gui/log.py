@@ -0,0 +1,85 @@
+import threading
+from collections import deque
+from typing import Deque, Optional, TextIO
+
+from PyQt6.QtCore import QCoreApplication, QObject, QTimer
+from PyQt6.QtWidgets import QPlainTextEdit
+
+FLUSH_INTERVAL = 100  # milliseconds
+MAX_LINES = 10000
+
+
+class LogSink(QObject):
+    """Shows the log of a worker thread in a view, in batches.
+
+    `write` can be called from any thread and only buffers the line. A timer
+    on the GUI thread moves the buffered lines to the view every
+    `FLUSH_INTERVAL` milliseconds with a single append. The buffer and the
+    view both keep the last `maxLines` lines, and with `spillPath` every line
+    is also appended to that file. `close` is called when the application
+    quits.
+    """
+
+    def __init__(
+        self,
+        view: QPlainTextEdit,
+        maxLines: int = MAX_LINES,
+        spillPath: Optional[str] = None,
+        parent: Optional[QObject] = None,
+    ):
+        super().__init__(parent)
+        self.view = view
+        self.view.setMaximumBlockCount(maxLines)
+
+        self._lock = threading.Lock()
+        self._pending: Deque[str] = deque(maxlen=maxLines)
+        self._dropped = 0
+
+        self._spill: Optional[TextIO] = None
+        if spillPath:
+            # Line buffered, so nothing is lost if the GUI is killed.
+            self._spill = open(spillPath, "a", encoding="utf-8", buffering=1)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.close)
+
+    def write(self, line: str):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.write(line + "\n")
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(line)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+
+        if dropped:
+            lines.insert(0, f"[... {dropped} lines not shown ...]")
+        self.view.appendPlainText("\n".join(lines))
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._dropped = 0
+        self.view.clear()
+
+    def close(self):
+        """Shows the last lines and closes the spill file."""
+        self._timer.stop()
+        self.flush()
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
@@ -1,6 +1,7 @@
 import os
 from typing import Optional
 
+from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import (
     QDialogButtonBox,
     QFileDialog,
@@ -9,12 +10,13 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QMessageBox,
     QProgressBar,
+    QPlainTextEdit,
     QPushButton,
-    QTextEdit,
     QVBoxLayout,
     QWidget,
 )
 
+from folderhide.gui.log import LogSink
 from folderhide.gui.utils import PasswordBar
 from folderhide.gui.workers import UnhideThread
 
@@ -27,8 +29,9 @@ class Unhide(QWidget):
     configFile: Optional[str] = None
     workingThread: Optional[UnhideThread] = None
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, logFile: Optional[str] = None):
         super().__init__(parent)
+        self.logFile = logFile
 
         self.progressBar = QProgressBar()
         self.progressBar.setTextVisible(False)
@@ -66,7 +69,11 @@ class Unhide(QWidget):
         self.workingThread = UnhideThread(self.configFile, password)
         self.workingThread.total.connect(self.progressBar.setMaximum)
         self.workingThread.progress.connect(self.progressBar.setValue)
-        self.workingThread.log.connect(self.logArea.append)
+        # Called on the worker thread, the sink batches lines for the view.
+        self.workingThread.log.connect(
+            self.logSink.write, Qt.ConnectionType.DirectConnection
+        )
+        self.workingThread.finished.connect(self.logSink.flush)
         self.workingThread.start()
 
     def _setFile(self):
@@ -87,7 +94,7 @@ class Unhide(QWidget):
         self.configFile = None
         self.filePathWidget.setText("")
         self.passwordBar.setText("")
-        self.logArea.setText("")
+        self.logSink.clear()
 
     def createButtons(self):
         startButton = QPushButton("Start")
@@ -100,8 +107,9 @@ class Unhide(QWidget):
         self.buttonArea.addButton(resetButton, QDialogButtonBox.ButtonRole.ResetRole)
 
     def createLogArea(self):
-        self.logArea = QTextEdit()
+        self.logArea = QPlainTextEdit()
         self.logArea.setReadOnly(True)
+        self.logSink = LogSink(self.logArea, spillPath=self.logFile, parent=self)
 
     def createPasswordRow(self):
         self.passwordLabel = QLabel("Password")
@@ -1,12 +1,6 @@
-import shutil
-from pathlib import Path
-from typing import Union
-
 from PyQt6 import QtCore
 from PyQt6.QtWidgets import QLineEdit
 
-PathType = Union[str, Path]
-
 
 def info(msg: str):
     return "[INFO] " + msg
@@ -20,12 +14,6 @@ def debug(msg: str):
     return "[DBG] " + msg
 
 
-def move_file(src: PathType, dest: PathType):
-    target_path = Path(dest)
-    target_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(src, dest)
-
-
 class PasswordBar(QLineEdit):
     def __init__(self):
         super().__init__()
@@ -1,14 +1,29 @@
+import threading
+
 from PyQt6.QtCore import QThread, pyqtSignal
 from folderhide.core import hide as hide_core, unhide as unhide_core
 from folderhide.gui.utils import info, error, debug
+from folderhide.progress import ProgressUpdate
 
 
 class BaseThread(QThread):
     _progress = 0
+    _total = -1
     progress = pyqtSignal(int)
     total = pyqtSignal(int)
     log = pyqtSignal(str)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stops the operation once the file being moved is done.
+
+        The journal is kept, so the operation can be resumed later.
+        """
+        self._cancel.set()
+
     def on_info(self, msg: str):
         self.log.emit(info(msg))
 
@@ -18,10 +33,14 @@ class BaseThread(QThread):
     def on_debug(self, msg: str):
         self.log.emit(debug(msg))
 
-    def on_progress(self, current: int, total: int):
-        self._progress = current
-        self.total.emit(total)
-        self.progress.emit(current)
+    def on_progress(self, update: ProgressUpdate):
+        # Updates already arrive at a bounded rate, see folderhide.progress.
+        if update.files_total != self._total:
+            self._total = update.files_total
+            self.total.emit(update.files_total)
+
+        self._progress = update.files_done
+        self.progress.emit(update.files_done)
 
 
 class HideThread(BaseThread):
@@ -42,6 +61,7 @@ class HideThread(BaseThread):
             self.on_debug,
             self.on_error,
             self.on_progress,
+            cancel=self._cancel,
         )
 
 
@@ -56,7 +76,8 @@ class UnhideThread(BaseThread):
             self._password,
             self._configFile,
             self.on_info,
-            self.on_error,
             self.on_debug,
+            self.on_error,
             self.on_progress,
+            cancel=self._cancel,
         )
@@ -0,0 +1,136 @@
+"""Append-only progress journal for hide and unhide.
+
+The journal lives next to the config (`<config>.journal`). It starts with a
+header naming the operation, the two folders the config paths are relative
+to, the pattern of the files being restored by a partial unhide and the first
+DATA chunk written by `hide --append`. It is followed by the config index
+(u32, little-endian) of every entry that has been moved. Indices are buffered
+and fsync'ed in batches, so after a crash at most one batch of finished moves
+is missing from it; `resume` checks those entries on disk instead of moving
+them again. For a partial unhide or an append, indices only count the matching
+or the appended entries, in config order.
+"""
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+from folderhide.utils import PathType
+
+MAGIC = b"FHJ3"
+SUFFIX = ".journal"
+
+OP_HIDE = "hide"
+OP_UNHIDE = "unhide"
+
+FLUSH_EVERY = 4096
+FLUSH_INTERVAL = 1.0
+
+_string = struct.Struct("<H")
+
+
+class JournalHeader(NamedTuple):
+    operation: str
+    original_root: str
+    hidden_root: str
+    only: str = ""
+    first_chunk: str = ""
+
+
+# Number of header fields in journals written by older versions.
+_FIELDS = {b"FHJ1": 3, b"FHJ2": 4, MAGIC: len(JournalHeader._fields)}
+
+
+def journal_path(config: PathType):
+    return Path(str(config) + SUFFIX)
+
+
+def _write_string(f: BinaryIO, s: str):
+    raw = s.encode("utf-8", "surrogatepass")
+    f.write(_string.pack(len(raw)))
+    f.write(raw)
+
+
+def _read_string(f: BinaryIO):
+    raw = f.read(_string.size)
+    if len(raw) < _string.size:
+        raise ValueError("Journal is truncated")
+
+    (length,) = _string.unpack(raw)
+    return f.read(length).decode("utf-8", "surrogatepass")
+
+
+class Journal:
+    def __init__(self, path: PathType, f: BinaryIO, header: JournalHeader):
+        self.path = Path(path)
+        self.header = header
+        self._f = f
+        self._records_start = f.tell()
+        self._pending = array("I")
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def create(cls, path: PathType, header: JournalHeader):
+        f = open(path, "xb")
+        f.write(MAGIC)
+        for s in header:
+            _write_string(f, s)
+        journal = cls(path, f, header)
+        journal.flush()
+        return journal
+
+    @classmethod
+    def open(cls, path: PathType):
+        f = open(path, "r+b")
+        fields = _FIELDS.get(f.read(len(MAGIC)))
+        if fields is None:
+            f.close()
+            raise ValueError("Not a folderhide journal")
+
+        header = JournalHeader(*(_read_string(f) for _ in range(fields)))
+        return cls(path, f, header)
+
+    def completed(self):
+        """Returns the indices of every committed entry."""
+        self._f.seek(self._records_start)
+        data = self._f.read()
+
+        # A record torn by a crash is dropped, the entry is checked on resume.
+        whole = len(data) - len(data) % self._pending.itemsize
+        self._f.seek(self._records_start + whole)
+        self._f.truncate()
+
+        done = array("I", data[:whole])
+        if sys.byteorder != "little":
+            done.byteswap()
+        return done
+
+    def commit(self, index: int):
+        self._pending.append(index)
+        if (
+            len(self._pending) >= FLUSH_EVERY
+            or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            if sys.byteorder != "little":
+                self._pending.byteswap()
+            self._f.write(self._pending.tobytes())
+            self._pending = array("I")
+
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+    def remove(self):
+        self._f.close()
+        os.remove(self.path)
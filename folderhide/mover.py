@@ -0,0 +1,306 @@
+import errno
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+)
+
+from folderhide.contents import Crypt, transfer
+from folderhide.journal import Journal
+from folderhide.pack import Packs
+from folderhide.progress import Progress
+from folderhide.stats import Stats
+from folderhide.utils import batched
+
+# Moves are prepared and run in batches: every directory a batch touches is
+# created and stat'ed once, and the busiest ones are opened, before any of its
+# files are renamed.
+BATCH_SIZE = 4096
+MAX_OPEN_DIRS = 256
+
+# Copies across devices run in the background, at most COPY_JOBS at a time per
+# pair of devices, while renames go ahead. Up to MAX_PENDING moves are queued.
+COPY_JOBS = 2
+MAX_PENDING = 2 * BATCH_SIZE
+
+USE_DIR_FD = os.rename in os.supports_dir_fd and os.open in os.supports_dir_fd
+
+
+class Move(NamedTuple):
+    position: int
+    src: str
+    dest: str
+    size: int = 0
+    # Where the file is in its pack, for packed files (see `folderhide.pack`).
+    offset: int = -1
+
+
+class DirectoryCache:
+    """Keeps the device and an open descriptor of every directory in use.
+
+    Moves between directories on the same device are plain renames relative
+    to the cached descriptors. Moves across devices are known before they are
+    attempted and go through `shutil.move`.
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, Optional[int]] = {}
+        self._fds: Dict[str, int] = {}
+
+    def prepare(self, batch: List[Move]):
+        uses = Counter(os.path.dirname(m.src) for m in batch)
+        targets = Counter(os.path.dirname(m.dest) for m in batch)
+        uses.update(targets)
+
+        for d in targets:
+            if d not in self._devices:
+                os.makedirs(d, exist_ok=True)
+
+        for d in uses:
+            if d not in self._devices:
+                try:
+                    self._devices[d] = os.stat(d).st_dev
+                except FileNotFoundError:
+                    self._devices[d] = None
+
+        if not USE_DIR_FD:
+            return
+
+        # Only the busiest directories of the batch get a descriptor, the
+        # others are renamed by path.
+        needed = {
+            d
+            for d, _ in uses.most_common(MAX_OPEN_DIRS)
+            if self._devices[d] is not None
+        }
+        for d in [d for d in self._fds if d not in needed]:
+            os.close(self._fds.pop(d))
+
+        for d in needed:
+            if d not in self._fds:
+                self._fds[d] = os.open(d, os.O_RDONLY | os.O_DIRECTORY)
+
+    def is_cross_device(self, src_dir: str, dest_dir: str):
+        return self._devices[src_dir] != self._devices[dest_dir]
+
+    def lane(self, m: Move) -> "Lane":
+        src_dev = self._devices[os.path.dirname(m.src)]
+        dest_dev = self._devices[os.path.dirname(m.dest)]
+        # A missing source is either skipped when resuming or fails, both
+        # are as quick as a rename.
+        return Lane(src_dev, dest_dev if src_dev is not None else None)
+
+    def move(self, src: str, dest: str):
+        """Moves a file and returns whether it had to be copied."""
+        src_dir, src_name = os.path.split(src)
+        dest_dir, dest_name = os.path.split(dest)
+        if self.is_cross_device(src_dir, dest_dir):
+            shutil.move(src, dest)
+            return True
+
+        src_fd = self._fds.get(src_dir)
+        dest_fd = self._fds.get(dest_dir)
+        try:
+            if src_fd is None or dest_fd is None:
+                os.rename(src, dest)
+            else:
+                os.rename(src_name, dest_name, src_dir_fd=src_fd, dst_dir_fd=dest_fd)
+        except OSError as e:
+            # Same st_dev does not always mean the same filesystem (bind
+            # mounts, btrfs subvolumes), so still fall back on EXDEV.
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(src, dest)
+            return True
+
+        return False
+
+    def move_or_skip(self, src: str, dest: str) -> Optional[bool]:
+        """Like `move`, but returns None if the file was already moved.
+
+        Used when resuming: a move that finished but never made it into the
+        journal has already left its source behind.
+        """
+        if not os.path.lexists(src) and os.path.lexists(dest):
+            return None
+        return self.move(src, dest)
+
+    def open(self, path: str, flags: int, mode: int = 0o777) -> int:
+        """Opens a file, relative to its directory when it has a descriptor."""
+        parent, name = os.path.split(path)
+        fd = self._fds.get(parent)
+        if fd is None:
+            return os.open(path, flags, mode)
+        return os.open(name, flags, mode, dir_fd=fd)
+
+    def remove(self, path: str):
+        parent, name = os.path.split(path)
+        fd = self._fds.get(parent)
+        if fd is None:
+            os.remove(path)
+        else:
+            os.remove(name, dir_fd=fd)
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+class Lane(NamedTuple):
+    """The source and destination devices of a group of moves."""
+
+    src_dev: Optional[int]
+    dest_dev: Optional[int]
+
+    @property
+    def copies(self):
+        return self.src_dev != self.dest_dev
+
+
+def schedule(
+    batch: List[Move], cache: DirectoryCache
+) -> Dict[Optional[Lane], List[Move]]:
+    """Splits a prepared batch by device pair, renames first.
+
+    The moves of every lane are grouped by source directory.
+    """
+    lanes: Dict[Lane, List[Move]] = {}
+    for m in sorted(batch, key=lambda m: os.path.dirname(m.src)):
+        lanes.setdefault(cache.lane(m), []).append(m)
+    ordered = sorted(lanes.items(), key=lambda item: item[0].copies)
+    return dict(ordered)
+
+
+def move_files(
+    moves: Iterable[Move],
+    progress: Progress,
+    jobs: int = 1,
+    journal: Optional[Journal] = None,
+    resuming: bool = False,
+    stats: Optional[Stats] = None,
+    crypt: Optional[Crypt] = None,
+    packs: Optional[Packs] = None,
+):
+    cache = DirectoryCache()
+    executors: Dict[Optional[Lane], Executor] = {}
+    pending: Dict[Future, Move] = {}
+
+    def finish(m: Move, copied: Optional[bool]):
+        # `copied` is None for a move that was done before resuming.
+        if journal:
+            journal.commit(m.position)
+        if stats:
+            if copied is None:
+                stats.files_skipped += 1
+            else:
+                stats.files_moved += 1
+                stats.bytes_moved += m.size
+                stats.cross_device_moves += copied
+        progress.advance(1, m.size)
+
+    def executor_for(lane: Optional[Lane]):
+        if lane not in executors:
+            if lane is None:
+                # Encrypting is CPU bound, so files are spread over processes.
+                # multiprocessing is only loaded when it is needed.
+                from concurrent.futures import ProcessPoolExecutor
+
+                executors[lane] = ProcessPoolExecutor(max_workers=jobs)
+            else:
+                workers = min(jobs, COPY_JOBS) if lane.copies else jobs
+                executors[lane] = ThreadPoolExecutor(max_workers=workers)
+        return executors[lane]
+
+    def drain(done_waiting: Callable[[], bool]):
+        while pending and not done_waiting():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(pending.pop(future), future.result())
+
+    # Returns whether the file was copied, or None if it was moved before
+    # resuming.
+    move: Callable[[str, str], Optional[bool]]
+    if crypt is None:
+        move = cache.move_or_skip if resuming else cache.move
+    else:
+        move = partial(transfer, crypt, resuming)
+
+    def move_packed(packed: List[Move]):
+        # Packs are read and written in order, on this thread.
+        if not packed:
+            return
+        if packs is None:
+            raise ValueError("Packed files need a Packer or an Unpacker")
+        for m in packed:
+            packs.move(m.src, m.dest, m.offset, m.size)
+        skipped = packs.sync(cache)
+        for m in packed:
+            done = (m.src, m.dest, m.offset, m.size) in skipped
+            finish(m, None if done else False)
+
+    try:
+        for batch in batched(moves, BATCH_SIZE):
+            cache.prepare(batch)
+            packed = [m for m in batch if m.offset >= 0]
+            if packed:
+                batch = [m for m in batch if m.offset < 0]
+            lanes: Dict[Optional[Lane], List[Move]]
+            if crypt is None:
+                lanes = schedule(batch, cache)
+            else:
+                lanes = {None: sorted(batch, key=lambda m: os.path.dirname(m.src))}
+
+            if jobs <= 1:
+                for lane_moves in lanes.values():
+                    for m in lane_moves:
+                        finish(m, move(m.src, m.dest))
+                move_packed(packed)
+                continue
+
+            # Renames use the descriptors of this batch, so they are done
+            # before the next one is prepared. Copies go by path and keep
+            # running in the background.
+            renames: Set[Future] = set()
+            for lane, lane_moves in lanes.items():
+                executor = executor_for(lane)
+                for m in lane_moves:
+                    future = executor.submit(move, m.src, m.dest)
+                    pending[future] = m
+                    if lane is not None and not lane.copies:
+                        renames.add(future)
+
+            move_packed(packed)
+            drain(lambda: renames.isdisjoint(pending) and len(pending) < MAX_PENDING)
+
+        drain(lambda: False)
+        if packs is not None:
+            packs.finish()
+    except BaseException:
+        # Stop at the first failure like the serial loop does; moves that are
+        # already running are left to finish.
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+        if packs is not None:
+            packs.close()
+        cache.close()
+        progress.report()
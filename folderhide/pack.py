@@ -0,0 +1,294 @@
+"""Pack files for `hide --pack-below`.
+
+Small files are not renamed one by one but appended to a few large pack
+files in the hidden folder. Where every file goes, its pack and offset, is
+decided when the folder is scanned and kept in the config (see `Plan.add`),
+so writing a file to its pack can simply be done again when resuming.
+
+Packed files are handled a batch of moves at a time. On hide, the sources
+are read ahead on a thread pool and written to their pack sequentially,
+through a large buffer, and the pack is fsync'ed before the sources are
+removed. On unhide, every pack is mapped into memory and its files are
+written back out of the mapping on the thread pool. The packs are removed
+once every file is out, unless only some of the files are unhidden.
+
+Only the contents of a packed file are kept: it comes back with the default
+permissions and the current time.
+"""
+import mmap
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import groupby
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from folderhide.mover import DirectoryCache
+
+BUFFER_SIZE = 1 << 20
+# Bytes of sources read ahead of the pack being written.
+READ_AHEAD = 64 << 20
+
+O_BINARY = getattr(os, "O_BINARY", 0)
+
+# A queued file: source, destination, offset in the pack and size. The pack
+# is the destination on hide and the source on unhide.
+Packed = Tuple[str, str, int, int]
+
+T = TypeVar("T")
+
+
+def _windows(queued: List[Packed]) -> Iterator[List[Packed]]:
+    window: List[Packed] = []
+    size = 0
+    for item in queued:
+        window.append(item)
+        size += item[3]
+        if size >= READ_AHEAD:
+            yield window
+            window = []
+            size = 0
+
+    if window:
+        yield window
+
+
+class _Pool:
+    def __init__(self, jobs: int):
+        self._pool = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    def map(self, func: Callable[..., T], items: Iterable) -> Iterable[T]:
+        if self._pool is None:
+            return map(func, items)
+        return self._pool.map(func, items)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class Packs(ABC):
+    """Files going into, or out of, their packs, a batch at a time.
+
+    `move` queues a file and `sync` writes the queued files. `finish` is
+    called once every file is done, and `close` in any case, to release
+    what is left.
+    """
+
+    def __init__(self, resuming: bool = False, jobs: int = 1):
+        self.resuming = resuming
+        self._pool = _Pool(jobs)
+        self._queued: List[Packed] = []
+
+    def move(self, src: str, dest: str, offset: int, size: int):
+        self._queued.append((src, dest, offset, size))
+
+    @abstractmethod
+    def sync(self, dirs: "DirectoryCache") -> Set[Packed]:
+        """Writes the queued files and returns those done before resuming."""
+
+    def finish(self):
+        pass
+
+    def close(self):
+        # Files that were queued but not synced are done again when resuming.
+        self._queued.clear()
+        self._pool.close()
+
+
+def _read(dirs: "DirectoryCache", item: Packed):
+    src, _, _, size = item
+    with os.fdopen(dirs.open(src, os.O_RDONLY | O_BINARY), "rb", 0) as f:
+        data = f.read(size + 1)
+    if len(data) != size:
+        raise OSError(src + " changed since the folder was scanned")
+    return data
+
+
+class Packer(Packs):
+    """Writes files into their packs, for hide."""
+
+    def __init__(self, resuming: bool = False, jobs: int = 1):
+        super().__init__(resuming, jobs)
+        self._pack: Optional[str] = None
+        self._f: Optional[BinaryIO] = None
+
+    def _open(self, pack: str):
+        self._close_pack()
+        # Not truncated, a pack is only partly rewritten when resuming.
+        fd = os.open(pack, os.O_WRONLY | os.O_CREAT | O_BINARY, 0o666)
+        self._f = os.fdopen(fd, "wb", buffering=BUFFER_SIZE)
+        self._pack = pack
+
+    def _close_pack(self):
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            self._f = None
+            self._pack = None
+
+    def sync(self, dirs: "DirectoryCache") -> Set[Packed]:
+        """Writes the queued files to their packs, makes them durable and
+        removes their sources.
+
+        Returns the queued files that were packed before resuming.
+        """
+        queued, self._queued = self._queued, []
+        skipped: Set[Packed] = set()
+        if self.resuming:
+            # A source that is gone was packed before.
+            skipped = {
+                item
+                for item in queued
+                if not os.path.lexists(item[0]) and os.path.lexists(item[1])
+            }
+            queued = [item for item in queued if item not in skipped]
+
+        for window in _windows(queued):
+            for (_, pack, offset, _), data in zip(
+                window, self._pool.map(partial(_read, dirs), window)
+            ):
+                if pack != self._pack:
+                    self._open(pack)
+                assert self._f is not None
+                if self._f.tell() != offset:
+                    self._f.seek(offset)
+                self._f.write(data)
+
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        for _ in self._pool.map(dirs.remove, [item[0] for item in queued]):
+            pass
+        return skipped
+
+    def finish(self):
+        self._close_pack()
+
+    def close(self):
+        super().close()
+        self._close_pack()
+
+
+def _sync_files(paths: List[str]):
+    if hasattr(os, "sync"):
+        os.sync()
+        return
+
+    for path in paths:
+        fd = os.open(path, os.O_RDWR | O_BINARY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Unpacker(Packs):
+    """Writes files back out of their packs, for unhide.
+
+    With `remove`, every pack that was read from is removed by `finish`. The
+    files of a pack are not always next to each other in the config, once a
+    partial unhide has rewritten some of its chunks.
+    """
+
+    def __init__(self, resuming: bool = False, remove: bool = True, jobs: int = 1):
+        super().__init__(resuming, jobs)
+        self.remove = remove
+        self._pack: Optional[str] = None
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._used: Set[str] = set()
+        # Only needed where the whole system can't be synced at once.
+        self._written: List[str] = []
+
+    def _open(self, pack: str):
+        self._close_map()
+        with open(pack, "rb") as f:
+            # Empty files only make empty packs, which can't be mapped.
+            if os.fstat(f.fileno()).st_size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+            else:
+                self._view = memoryview(b"")
+        self._pack = pack
+        self._used.add(pack)
+
+    def _close_map(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._pack = None
+
+    def _write(self, view: memoryview, dirs: "DirectoryCache", item: Packed):
+        pack, dest, offset, size = item
+        if offset + size > len(view):
+            raise ValueError(pack + " is truncated")
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | O_BINARY
+        with os.fdopen(dirs.open(dest, flags, 0o666), "wb") as f:
+            f.write(view[offset : offset + size])
+
+    def seen(self, pack: str):
+        """Records a pack read from by an earlier run, to be removed too."""
+        self._used.add(pack)
+
+    def sync(self, dirs: "DirectoryCache") -> Set[Packed]:
+        """Writes the queued files out of their packs.
+
+        Returns the queued files that were written out before resuming.
+        """
+        queued, self._queued = self._queued, []
+        skipped: Set[Packed] = set()
+        for pack, items in groupby(queued, key=lambda item: item[0]):
+            todo = list(items)
+            if pack != self._pack:
+                if self.resuming and not os.path.lexists(pack):
+                    # Removed once the files it held were out.
+                    done = {item for item in todo if os.path.lexists(item[1])}
+                    skipped |= done
+                    todo = [item for item in todo if item not in done]
+                    if not todo:
+                        continue
+                self._open(pack)
+
+            assert self._view is not None
+            write = partial(self._write, self._view, dirs)
+            for _ in self._pool.map(write, todo):
+                pass
+            if not hasattr(os, "sync"):
+                self._written.extend(item[1] for item in todo)
+        return skipped
+
+    def finish(self):
+        self._close_map()
+        if not self.remove:
+            return
+
+        # The files must be on disk before their only other copy is gone.
+        _sync_files(self._written)
+        for pack in self._used:
+            if os.path.lexists(pack):
+                os.remove(pack)
+        self._used.clear()
+
+    def close(self):
+        super().close()
+        self._close_map()
+        self._written.clear()
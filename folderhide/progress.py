@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+# Progress is checked against the clock once every CHECK_EVERY files and
+# reported at most once every INTERVAL seconds.
+CHECK_EVERY = 64
+INTERVAL = 0.1
+
+_NEVER = float("inf")
+
+
+class ProgressUpdate(NamedTuple):
+    phase: str
+    files_done: int
+    files_total: int
+    bytes_done: int = 0
+    bytes_total: int = 0
+
+
+ProgressFunction = Callable[[ProgressUpdate], None]
+
+
+class Cancelled(Exception):
+    """Raised by `Progress.advance` once the operation has been cancelled."""
+
+
+class Progress:
+    """Aggregates per-file progress and reports it at a bounded rate.
+
+    Without a callback, `advance` only bumps two counters. When `cancel` is
+    set, the next check raises `Cancelled` from `advance`, which is only
+    called once a file is fully done with.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[ProgressFunction] = None,
+        interval: float = INTERVAL,
+        check_every: int = CHECK_EVERY,
+        cancel: Optional[threading.Event] = None,
+    ):
+        self._callback = callback
+        self._interval = interval
+        self._check_every = check_every
+        self._cancel = cancel
+        self._next_check = _NEVER
+        self._last_report = 0.0
+
+        self.phase = ""
+        self.files_done = 0
+        self.files_total = 0
+        self.bytes_done = 0
+        self.bytes_total = 0
+
+    def start(self, phase: str, files_total: int = 0, bytes_total: int = 0):
+        self.phase = phase
+        self.files_done = 0
+        self.files_total = files_total
+        self.bytes_done = 0
+        self.bytes_total = bytes_total
+        if self._callback is not None or self._cancel is not None:
+            self._next_check = self._check_every
+        self.report()
+
+    def advance(self, files: int = 1, nbytes: int = 0):
+        self.files_done += files
+        self.bytes_done += nbytes
+        if self.files_done >= self._next_check:
+            self._next_check = self.files_done + self._check_every
+            if self._cancel is not None and self._cancel.is_set():
+                raise Cancelled()
+            if time.monotonic() - self._last_report >= self._interval:
+                self.report()
+
+    def report(self):
+        if self._callback is None:
+            return
+
+        self._last_report = time.monotonic()
+        self._callback(
+            ProgressUpdate(
+                self.phase,
+                self.files_done,
+                self.files_total,
+                self.bytes_done,
+                self.bytes_total,
+            )
+        )
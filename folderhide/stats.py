@@ -0,0 +1,60 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class Stats:
+    """Timings and counters of one hide, unhide or resume run.
+
+    Phases are timed with `phase`. The mover fills in the move counters.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.completed = False
+        self.phases: Dict[str, float] = {}
+        self.files_moved = 0
+        # Moves found already done when resuming.
+        self.files_skipped = 0
+        self.bytes_moved = 0
+        self.cross_device_moves = 0
+        self.kdf_time = 0.0
+        self._start = time.perf_counter()
+        self.total_time = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self, completed: bool = True):
+        self.completed = completed
+        self.total_time = time.perf_counter() - self._start
+        return self
+
+    @property
+    def move_rate(self):
+        elapsed = self.phases.get("move")
+        return self.files_moved / elapsed if elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "operation": self.operation,
+            "completed": self.completed,
+            "total_time": self.total_time,
+            "phases": self.phases,
+            "files_moved": self.files_moved,
+            "files_skipped": self.files_skipped,
+            "bytes_moved": self.bytes_moved,
+            "move_rate": self.move_rate,
+            "cross_device_moves": self.cross_device_moves,
+            "kdf_time": self.kdf_time,
+        }
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
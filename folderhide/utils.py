@@ -1,11 +1,32 @@
+import functools
+import math
+import os
 import random
+import re
 import string
 import shutil
+import stat
+import time
+from array import array
+from fnmatch import translate
 from pathlib import Path
-from typing import List, Optional, Union, cast, NamedTuple
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import scrypt
+# pycryptodome is imported by the functions that use it, so that starting the
+# CLI, or importing this module for its helpers, doesn't load it.
 
 random.seed("folderhide")
 salt = random.randbytes(16)
@@ -13,14 +34,119 @@ salt = random.randbytes(16)
 
 PathType = Union[str, Path]
 
+T = TypeVar("T")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yields lists of `size` consecutive items, the last one possibly shorter."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
 
 class FileMetadata(NamedTuple):
     original: str
     modified: str
+    # Unknown (-1 and empty) in configs written before they were recorded.
+    size: int = -1
+    digest: bytes = b""
+    # Where the file is in `modified`, for a file kept in a pack.
+    offset: int = -1
 
+    @property
+    def is_dir(self):
+        """Whether this is a whole directory (see `scan_units`)."""
+        return self.original.endswith(os.sep)
+
+
+# Length of the random names of hidden files.
+NAME_SIZE = 16
+
+
+def shards_fit(depth: int, width: int):
+    """Whether `depth` levels of `width` characters fit in a random name."""
+    return depth * width < NAME_SIZE
+
+
+class Layout(NamedTuple):
+    """Where the hidden files are placed inside the target directory.
+
+    With a non-zero `depth`, every file is put `depth` directories deep, each
+    named after the next `width` characters of the file's random name. That
+    spreads the files over up to 62 ** (width * depth) directories. The shards
+    must leave part of the name over (see `shards_fit`).
+    """
+
+    target: str
+    depth: int = 0
+    width: int = 1
+
+    def path(self, name: str):
+        if not self.depth:
+            return os.path.join(self.target, name)
+
+        end = self.depth * self.width
+        shards = [name[i : i + self.width] for i in range(0, end, self.width)]
+        return os.path.join(self.target, *shards, name)
+
+
+class KDFParams(NamedTuple):
+    """scrypt parameters. The defaults are the ones used by configs that do
+    not record their own."""
+
+    log_n: int = 14
+    r: int = 8
+    p: int = 1
+    salt: bytes = salt
+
+
+DEFAULT_KDF_COST = 14
+MIN_KDF_COST = 10
+MAX_KDF_COST = 20
+
+
+def new_kdf_params(cost: int = DEFAULT_KDF_COST):
+    return KDFParams(cost, 8, 1, os.urandom(16))
+
+
+@functools.lru_cache(maxsize=16)
+def _scrypt(password: str, params: KDFParams) -> bytes:
+    from Crypto.Protocol.KDF import scrypt
+
+    log_n, r, p, salt = params
+    return cast(bytes, scrypt(password, salt, 16, N=2**log_n, r=r, p=p))  # type: ignore
+
+
+def derive_key(password: str, params: KDFParams = KDFParams()) -> bytes:
+    # Keys are cached for the life of the process, so configs sharing a
+    # password and salt only pay for the KDF once.
+    return _scrypt(password, params)
+
+
+def calibrate_kdf(budget: float) -> int:
+    """Returns the largest scrypt cost that derives a key within `budget`
+    seconds on this machine."""
+    from Crypto.Protocol.KDF import scrypt
+
+    params = new_kdf_params(DEFAULT_KDF_COST)
+    start = time.perf_counter()
+    scrypt("calibration", params.salt, 16, N=2**params.log_n, r=params.r, p=1)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+
+    # scrypt's running time grows linearly with N.
+    cost = DEFAULT_KDF_COST + math.floor(math.log2(budget / elapsed))
+    return min(max(cost, MIN_KDF_COST), MAX_KDF_COST)
+
+
+def get_cipher(key: bytes, nonce: Optional[bytes] = None):
+    from Crypto.Cipher import AES
 
-def get_crypto(password: str, nonce: Optional[bytes] = None):
-    key = cast(bytes, scrypt(password, salt, 16, N=2 ** 14, r=8, p=1))  # type: ignore
     if nonce:
         cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
     else:
@@ -29,45 +155,443 @@ def get_crypto(password: str, nonce: Optional[bytes] = None):
     return cipher
 
 
+def get_crypto(password: str, nonce: Optional[bytes] = None):
+    return get_cipher(derive_key(password), nonce)
+
+
+def glob_prefix(pattern: str):
+    """Returns the part of `pattern` before its first wildcard."""
+    match = re.search(r"[*?[]", pattern)
+    return pattern[: match.start()] if match else pattern
+
+
+def _compile_globs(patterns: List[str]):
+    if not patterns:
+        return None
+    return re.compile("|".join(translate(p) for p in patterns)).match
+
+
+class _Matcher:
+    """Matches paths against a set of rules (see `PathFilter`).
+
+    Literal rules are looked up in sets, and all the glob rules of a kind are
+    compiled into a single regular expression.
+    """
+
+    def __init__(self, rules: Sequence[str]):
+        names: List[str] = []
+        paths: List[str] = []
+        for rule in rules:
+            # A "/" at the end only restricts the rule to directories.
+            anchored = "/" in rule.rstrip("/")
+            rule = rule.strip("/").replace("/", os.sep)
+            if rule:
+                (paths if anchored else names).append(rule)
+
+        self.names = names
+        self.paths = paths
+        self._literal_names = {n for n in names if glob_prefix(n) == n}
+        self._literal_paths = {p for p in paths if glob_prefix(p) == p}
+        self._name_globs = _compile_globs(
+            [n for n in names if n not in self._literal_names]
+        )
+        self._path_globs = _compile_globs(
+            [p for p in paths if p not in self._literal_paths]
+        )
+        # A directory can only hold matches of a path rule if it is on the
+        # way to, or below, the literal start of that rule.
+        self._prefixes = [glob_prefix(p) for p in paths]
+
+    def __bool__(self):
+        return bool(self.names or self.paths)
+
+    def __call__(self, path: str, name: str):
+        return (
+            name in self._literal_names
+            or path in self._literal_paths
+            or (self._name_globs is not None and self._name_globs(name) is not None)
+            or (self._path_globs is not None and self._path_globs(path) is not None)
+        )
+
+    def could_match_under(self, path: str):
+        if self.names:
+            return True
+        directory = path + os.sep
+        return any(
+            prefix.startswith(directory) or path.startswith(prefix)
+            for prefix in self._prefixes
+        )
+
+
+def _file_rules(rules: Sequence[str]):
+    return [rule for rule in rules if not rule.endswith("/")]
+
+
+class PathFilter:
+    """Include and exclude rules, checked while the folder is walked.
+
+    Rules use "/" and are relative to the folder being hidden. A rule without
+    "/" matches the name of a file or directory at any depth, like ".git" or
+    "*.tmp"; other rules match the whole path, like "build/cache",
+    "photos/*.jpg" or "/build". "*" also matches "/". A rule ending with "/"
+    only matches directories. A directory that matches a rule stands for
+    everything under it.
+
+    With include rules, only the files they match are kept. Exclude rules win
+    over include rules, and excluded directories are never opened.
+    """
+
+    def __init__(self, include: Sequence[str] = (), exclude: Sequence[str] = ()):
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self._include = _Matcher(include)
+        self._exclude = _Matcher(exclude)
+        self._include_files = _Matcher(_file_rules(include))
+        self._exclude_files = _Matcher(_file_rules(exclude))
+
+    def __bool__(self):
+        return bool(self._include or self._exclude)
+
+    def directory(self, path: str, name: str, included: bool) -> Optional[bool]:
+        """Returns None if the directory at `path` is skipped, or else whether
+        everything under it is included."""
+        if self._exclude(path, name):
+            return None
+        if included or self._include(path, name):
+            return True
+        return False if self._include.could_match_under(path) else None
+
+    def file(self, path: str, name: str, included: bool):
+        if self._exclude_files(path, name):
+            return False
+        return included or self._include_files(path, name)
+
+
+def _walk(
+    dir: PathType, base_path: PathType, path_filter: Optional[PathFilter] = None
+) -> Iterator[Tuple[str, os.DirEntry]]:
+    root = os.fspath(dir)
+    if path_filter is not None and not path_filter:
+        path_filter = None
+    # With a filter, the path of every directory relative to `dir` is kept
+    # along, and whether it is included as a whole.
+    included = path_filter is None or not path_filter.include
+    stack = [(root, os.path.relpath(root, base_path), "", included)]
+    while stack:
+        current, prefix, inner, included = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                relative = os.path.join(prefix, entry.name)
+                if path_filter is not None:
+                    path = inner + entry.name
+                    if entry.is_dir():
+                        subtree = path_filter.directory(path, entry.name, included)
+                        if subtree is not None:
+                            stack.append((entry.path, relative, path + os.sep, subtree))
+                    elif path_filter.file(path, entry.name, included):
+                        yield relative, entry
+                elif entry.is_dir():
+                    stack.append((entry.path, relative, "", True))
+                else:
+                    yield relative, entry
+
+
+def walk_files(
+    dir: PathType, base_path: PathType, path_filter: Optional[PathFilter] = None
+) -> Iterator[str]:
+    """Yields the path of every file under `dir`, relative to `base_path`.
+
+    The tree is walked iteratively with `os.scandir`, so the type of each
+    entry comes from the directory listing itself and deep trees do not hit
+    the recursion limit. Directories excluded by `path_filter` are skipped
+    without being opened.
+    """
+    for relative, _ in _walk(dir, base_path, path_filter):
+        yield relative
+
+
+def scan_files(
+    dir: PathType, base_path: PathType, path_filter: Optional[PathFilter] = None
+) -> Iterator[Tuple[str, int]]:
+    """Like `walk_files`, but also yields the size of every file."""
+    for relative, entry in _walk(dir, base_path, path_filter):
+        yield relative, entry.stat(follow_symlinks=False).st_size
+
+
+LEAF_DIRS = -1
+
+
+def _keeps_all(path_filter: PathFilter, dir: str, inner: str):
+    """Returns whether `path_filter` keeps everything under `dir`."""
+    stack = [(dir, inner)]
+    while stack:
+        current, inner = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                path = inner + entry.name
+                if entry.is_dir():
+                    if not path_filter.directory(path, entry.name, True):
+                        return False
+                    stack.append((entry.path, path + os.sep))
+                elif not path_filter.file(path, entry.name, True):
+                    return False
+    return True
+
+
+def _scanned(relative: str, entry: os.DirEntry):
+    st = entry.stat(follow_symlinks=False)
+    return relative, st.st_size, stat.S_ISREG(st.st_mode)
+
+
+def scan_units(
+    dir: PathType,
+    base_path: PathType,
+    path_filter: Optional[PathFilter] = None,
+    whole_dirs: int = 0,
+) -> Iterator[Tuple[str, int, bool]]:
+    """Like `scan_files`, but yields some directories instead of their files,
+    and whether every path is a regular file.
+
+    With `whole_dirs` set to N, every directory N levels below `dir` is
+    yielded as a whole, without being opened; with `LEAF_DIRS`, every
+    directory without subdirectories. Directory paths end with a separator
+    and have a size of -1. A directory with anything left out by
+    `path_filter` is walked as usual instead.
+    """
+    if not whole_dirs:
+        for relative, entry in _walk(dir, base_path, path_filter):
+            yield _scanned(relative, entry)
+        return
+
+    if path_filter is not None and not path_filter:
+        path_filter = None
+    root = os.fspath(dir)
+    included = path_filter is None or not path_filter.include
+    stack = [(root, os.path.relpath(root, base_path), "", included, 0)]
+    while stack:
+        current, prefix, inner, included, depth = stack.pop()
+        with os.scandir(current) as it:
+            entries = list(it)
+
+        if whole_dirs == LEAF_DIRS and depth and included:
+            if not any(entry.is_dir() for entry in entries) and (
+                path_filter is None or _keeps_all(path_filter, current, inner)
+            ):
+                yield prefix + os.sep, -1, False
+                continue
+
+        for entry in entries:
+            relative = os.path.join(prefix, entry.name)
+            path = inner + entry.name
+            if entry.is_dir():
+                subtree: Optional[bool] = True
+                if path_filter is not None:
+                    subtree = path_filter.directory(path, entry.name, included)
+                if subtree is None:
+                    continue
+
+                if (
+                    depth + 1 == whole_dirs
+                    and subtree
+                    and (
+                        path_filter is None
+                        or _keeps_all(path_filter, entry.path, path + os.sep)
+                    )
+                ):
+                    yield relative + os.sep, -1, False
+                else:
+                    item = (entry.path, relative, path + os.sep, subtree, depth + 1)
+                    stack.append(item)
+            elif path_filter is None or path_filter.file(path, entry.name, included):
+                yield _scanned(relative, entry)
+
+
 def get_all_files(dir: PathType, base_path: PathType):
-    if isinstance(dir, str):
-        working_dir = Path(dir)
-    else:
-        working_dir = dir
+    return list(walk_files(dir, base_path))
 
-    files: List[str] = []
-    for d in working_dir.iterdir():
-        if d.is_dir():
-            files.extend(get_all_files(d, base_path))
-        else:
-            files.append(str(d.relative_to(base_path)))
 
-    return files
+ALPHABET = string.ascii_uppercase + string.ascii_lowercase + string.digits
+
+# Random bytes are mapped onto ALPHABET with a lookup table. Bytes at or above
+# the largest multiple of len(ALPHABET) are dropped so that every character
+# stays equally likely.
+_ALPHABET_TABLE = bytes(ord(ALPHABET[b % len(ALPHABET)]) for b in range(256))
+_REJECTED_BYTES = bytes(range(256 - 256 % len(ALPHABET), 256))
+
+
+def random_names(N: int = 16, batch: int = 4096) -> Iterator[str]:
+    while True:
+        data = os.urandom(N * batch + N * batch // 16 + N)
+        chars = data.translate(_ALPHABET_TABLE, _REJECTED_BYTES).decode("ascii")
+        for i in range(0, len(chars) - N + 1, N):
+            yield chars[i : i + N]
 
 
 def random_str(N: int = 8):
-    return "".join(
-        random.SystemRandom().choice(
-            string.ascii_uppercase + string.ascii_lowercase + string.digits
+    return next(random_names(N, batch=1))
+
+
+PACK_SIZE = 1 << 28
+
+
+class _NameFilter:
+    """Remembers which random names are in use, in a bitmap of a few bits per
+    name instead of a set holding every name.
+
+    A name can be reported as used when it is not, which only costs drawing
+    another one.
+    """
+
+    BITS_PER_NAME = 32
+
+    def __init__(self, capacity: int = 256):
+        self._bits = bytearray(capacity * self.BITS_PER_NAME // 8)
+        self._slots = len(self._bits) * 8
+        self.capacity = capacity
+        self.count = 0
+
+    def __contains__(self, name: bytes):
+        slot = hash(name) % self._slots
+        return bool(self._bits[slot >> 3] & (1 << (slot & 7)))
+
+    def add(self, name: bytes):
+        slot = hash(name) % self._slots
+        self._bits[slot >> 3] |= 1 << (slot & 7)
+        self.count += 1
+
+
+class Plan:
+    """The files of a hide and their random names, stored compactly.
+
+    Directories are interned: every file keeps the index of its directory and
+    its name, packed in a shared buffer. Random names take `NAME_SIZE` bytes
+    each in another buffer, and sizes, digests and offsets are packed as well.
+    `FileMetadata` entries are only built when they are asked for.
+
+    Files added with `packed` share the random name of a pack file, which
+    holds up to `PACK_SIZE` bytes of them (see `folderhide.pack`).
+    """
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        prefix = os.path.join(layout.target, "")
+        self._path = layout.path if layout.depth else prefix.__add__
+        self._random = random_names(NAME_SIZE)
+        self._used = _NameFilter()
+
+        self._dirs: List[str] = []
+        self._dir_indices: Dict[str, int] = {}
+        self._file_dirs = array("I")
+        self._names = bytearray()
+        self._name_ends = array("Q")
+        self._hidden = bytearray()
+        self.sizes = array("q")
+        self._digests = bytearray()
+        self._digest_size = 0
+        self.offsets = array("q")
+        self._pack: Optional[str] = None
+        self._pack_end = 0
+
+    def __len__(self):
+        return len(self._file_dirs)
+
+    def _use(self, name: bytes):
+        if self._used.count >= self._used.capacity:
+            used = _NameFilter(self._used.capacity * 2)
+            for i in range(0, len(self._hidden), NAME_SIZE):
+                used.add(bytes(self._hidden[i : i + NAME_SIZE]))
+            self._used = used
+        self._used.add(name)
+
+    def _new_name(self, taken: Optional[Callable[[str], bool]]):
+        name = next(self._random)
+        while name.encode() in self._used or (taken and taken(self._path(name))):
+            name = next(self._random)
+        self._use(name.encode())
+        return name
+
+    def add(
+        self,
+        original: str,
+        size: int = -1,
+        taken: Optional[Callable[[str], bool]] = None,
+        packed: bool = False,
+    ):
+        """Gives `original` a unique random name and returns its entry.
+
+        `taken` is asked about every hidden path, for names already in use by
+        an earlier hide. With `packed`, `original` gets the name of the
+        current pack and the next `size` bytes of it instead.
+        """
+        offset = -1
+        if not packed:
+            name = self._new_name(taken)
+        else:
+            if self._pack is None or (
+                self._pack_end and self._pack_end + size > PACK_SIZE
+            ):
+                self._pack = self._new_name(taken)
+                self._pack_end = 0
+            name = self._pack
+            offset = self._pack_end
+            self._pack_end += size
+        self._hidden += name.encode()
+        self.offsets.append(offset)
+
+        parent, _, base = original.rpartition(os.sep)
+        index = self._dir_indices.get(parent)
+        if index is None:
+            index = self._dir_indices[parent] = len(self._dirs)
+            self._dirs.append(parent)
+        self._file_dirs.append(index)
+        self._names += base.encode("utf-8", "surrogatepass")
+        self._name_ends.append(len(self._names))
+        self.sizes.append(size)
+
+        return FileMetadata(original, self._path(name), size, offset=offset)
+
+    def add_digest(self, digest: bytes):
+        """Records the digest of the next file, in the order they were added."""
+        self._digest_size = len(digest)
+        self._digests += digest
+
+    def __getitem__(self, i: int):
+        start = self._name_ends[i - 1] if i else 0
+        base = self._names[start : self._name_ends[i]].decode("utf-8", "surrogatepass")
+        parent = self._dirs[self._file_dirs[i]]
+        name = self._hidden[i * NAME_SIZE : (i + 1) * NAME_SIZE].decode("ascii")
+
+        digest = b""
+        if len(self._digests) > i * self._digest_size:
+            start = i * self._digest_size
+            digest = bytes(self._digests[start : start + self._digest_size])
+
+        return FileMetadata(
+            parent + os.sep + base if parent else base,
+            self._path(name),
+            self.sizes[i],
+            digest,
+            self.offsets[i],
         )
-        for _ in range(N)
-    )
 
+    def __iter__(self) -> Iterator[FileMetadata]:
+        for i in range(len(self)):
+            yield self[i]
 
-def generate_config(files: List[str], target_dir: Path):
-    output_datas: List[FileMetadata] = []
-    used_strs: List[str] = []
 
+def plan_files(
+    files: Iterable[str],
+    layout: Layout,
+    taken: Optional[Callable[[str], bool]] = None,
+) -> Iterator[FileMetadata]:
+    """Gives every file a unique random name in `layout` (see `Plan.add`)."""
+    plan = Plan(layout)
     for src in files:
-        new_fname = random_str(16)
-        while new_fname in used_strs:
-            new_fname = random_str(16)
+        yield plan.add(src, taken=taken)
 
-        new_path = target_dir / new_fname
-        output_datas.append(FileMetadata(src, str(new_path)))
-        used_strs.append(new_fname)
 
-    return output_datas
+def generate_config(files: Iterable[str], target_dir: Path):
+    return list(plan_files(files, Layout(str(target_dir))))
 
 
 def move_file(src: PathType, dest: PathType):
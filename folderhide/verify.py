@@ -0,0 +1,100 @@
+"""Checks that the hidden files of a config are all in place, without moving
+anything.
+
+The stat pass looks up every hidden path on a thread pool, in batches, and
+compares its size with the one recorded at hide time. Configs written before
+sizes were recorded are only checked for missing files, and packed files only
+have to fit in their pack.
+"""
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from folderhide.contents import encrypted_size
+from folderhide.progress import Progress
+from folderhide.utils import FileMetadata, batched
+
+MISSING = "missing"
+CHANGED = "changed"
+
+BATCH_SIZE = 1024
+
+
+class Problem(NamedTuple):
+    entry: FileMetadata
+    reason: str
+
+
+class VerifyReport(NamedTuple):
+    checked: int
+    missing: List[str]
+    changed: List[str]
+    # Entries of older configs, which have no size to compare.
+    unsized: int
+
+    @property
+    def ok(self):
+        return not self.missing and not self.changed
+
+
+def _check_batch(root: str, encrypted: bool, entries: List[FileMetadata]):
+    problems: List[Problem] = []
+    # Packs hold many files, they are only looked up once per batch.
+    packs: Dict[str, Optional[os.stat_result]] = {}
+    for entry in entries:
+        if entry.offset >= 0:
+            if entry.modified not in packs:
+                try:
+                    packs[entry.modified] = os.lstat(os.path.join(root, entry.modified))
+                except FileNotFoundError:
+                    packs[entry.modified] = None
+
+            pack = packs[entry.modified]
+            if pack is None:
+                problems.append(Problem(entry, MISSING))
+            elif pack.st_size < entry.offset + entry.size:
+                problems.append(Problem(entry, CHANGED))
+            continue
+
+        try:
+            st = os.lstat(os.path.join(root, entry.modified))
+        except FileNotFoundError:
+            problems.append(Problem(entry, MISSING))
+            continue
+
+        if entry.size < 0:
+            continue
+
+        # Links are moved as they are, even with encrypted contents.
+        expected = entry.size
+        if encrypted and not stat.S_ISLNK(st.st_mode):
+            expected = encrypted_size(entry.size)
+        if st.st_size != expected:
+            problems.append(Problem(entry, CHANGED))
+
+    return problems
+
+
+def check_files(
+    entries: Iterable[FileMetadata],
+    root: str,
+    progress: Progress,
+    jobs: int = 1,
+    encrypted: bool = False,
+) -> Iterator[Problem]:
+    """Yields the entries whose hidden file, under `root`, is missing or has
+    the wrong size. A packed file has the wrong size if it doesn't fit in
+    its pack."""
+    check = partial(_check_batch, root, encrypted)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [(batch, pool.submit(check, batch)) for batch in batched(entries, BATCH_SIZE)]
+        try:
+            for batch, future in futures:
+                problems = future.result()
+                progress.advance(len(batch))
+                yield from problems
+        finally:
+            for _, future in futures:
+                future.cancel()
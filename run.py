@@ -1,3 +1,4 @@
-from folderhide.cli import cli
+from folderhide.__main__ import main
 
-cli()
+if __name__ == "__main__":
+    main()
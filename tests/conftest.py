@@ -0,0 +1,53 @@
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from folderhide.config import ConfigWriter
+
+PASSWORD = "password"
+
+FILES = {
+    "data/a.txt": b"alpha",
+    "data/sub/b.txt": b"bravo",
+    "data/sub/deep/c.txt": b"charlie",
+    "data/skip.log": b"log",
+}
+
+
+def quiet(_: str):
+    pass
+
+
+def write_tree(root: Path, files: Dict[str, bytes]):
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def read_tree(root: Path):
+    return {
+        path.relative_to(root).as_posix(): path.read_bytes()
+        for path in root.rglob("*")
+        if path.is_file()
+    }
+
+
+@pytest.fixture
+def tree(tmp_path: Path):
+    """A folder of a few files in `tmp_path`, with its expected contents."""
+    files = dict(FILES)
+    for i in range(50):
+        files["data/many/%02d/file%d.bin" % (i % 7, i)] = bytes([i]) * (i * 37)
+    write_tree(tmp_path, files)
+    return files
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Spreads the entries of new configs over many chunks of 4, so that
+    selecting them goes through the index."""
+    defaults = ConfigWriter.__init__.__defaults__
+    assert defaults is not None
+    monkeypatch.setattr(ConfigWriter.__init__, "__defaults__", (4,) + defaults[1:])
@@ -0,0 +1,28 @@
+import asyncio
+from pathlib import Path
+
+from folderhide import aio
+from folderhide.utils import MIN_KDF_COST
+from tests.conftest import PASSWORD, read_tree
+
+
+def test_operations(tmp_path: Path, tree):
+    config = str(tmp_path / "cfg.enc")
+
+    async def run():
+        op = aio.hide(str(tmp_path / "data"), PASSWORD, config, kdf_cost=MIN_KDF_COST)
+        phases = {update.phase async for update in op}
+        stats = await op
+        assert stats.completed
+        assert stats.files_moved == len(tree)
+        assert "move" in phases
+
+        report = await aio.verify(PASSWORD, config)
+        assert report is not None
+        assert report.checked == len(tree)
+
+        stats = await aio.unhide(PASSWORD, config, jobs=2)
+        assert stats.completed
+
+    asyncio.run(run())
+    assert read_tree(tmp_path) == tree
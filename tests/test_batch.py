@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+from typing import List
+
+from folderhide import batch, core
+from folderhide.config import read_kdf_params
+from folderhide.utils import MIN_KDF_COST
+from tests.conftest import PASSWORD, quiet, read_tree, write_tree
+
+
+def test_folder_given_twice(tmp_path: Path, tree):
+    folder = str(tmp_path / "data")
+    os.symlink(folder, str(tmp_path / "link"))
+    results = batch.batch_hide(
+        [folder, folder + os.sep, str(tmp_path / "link")],
+        PASSWORD,
+        workers=1,
+        kdf_cost=MIN_KDF_COST,
+    )
+    assert sorted(result.ok for result in results) == [False, False, True]
+    assert [result.errors for result in results if not result.ok] == [
+        ["Folder given twice."]
+    ] * 2
+
+    core.unhide(PASSWORD, batch.config_for(folder), quiet, quiet, quiet)
+    assert read_tree(tmp_path / "data") == {
+        name[len("data/") :]: data for name, data in tree.items()
+    }
+
+
+def test_config_never_overwritten(tmp_path: Path, tree):
+    config = tmp_path / "cfg.enc"
+    config.write_bytes(b"config")
+    errors: List[str] = []
+    stats = core.hide(
+        str(tmp_path / "data"),
+        PASSWORD,
+        str(config),
+        quiet,
+        quiet,
+        errors.append,
+        kdf_cost=MIN_KDF_COST,
+    )
+    assert not stats.completed
+    assert errors == ["Config " + str(config) + " already exists."]
+    assert config.read_bytes() == b"config"
+    assert read_tree(tmp_path / "data")
+
+
+def make_folders(tmp_path: Path, count: int):
+    folders = []
+    for i in range(count):
+        folder = tmp_path / ("folder%d" % i)
+        write_tree(folder, {"a.txt": b"a%d" % i, "sub/b.txt": b"b%d" % i})
+        folders.append(str(folder))
+    return folders
+
+
+def test_batch_roundtrip(tmp_path: Path):
+    folders = make_folders(tmp_path, 3)
+    before = read_tree(tmp_path)
+    reported: List[batch.BatchResult] = []
+    results = batch.batch_hide(
+        folders,
+        PASSWORD,
+        workers=2,
+        kdf_cost=MIN_KDF_COST,
+        pack_below=1024,
+        on_result=reported.append,
+    )
+    assert results == reported
+    assert sorted(result.target for result in results) == folders
+    assert all(result.ok for result in results)
+    assert all(result.stats.files_moved == 2 for result in results)
+
+    # Every config of the batch shares the key derivation.
+    configs = [batch.config_for(folder) for folder in folders]
+    kdfs = set()
+    for config in configs:
+        with open(config, "rb") as f:
+            kdfs.add(read_kdf_params(f))
+    assert len(kdfs) == 1
+
+    results = batch.batch_unhide(configs, PASSWORD, workers=2)
+    assert all(result.ok for result in results)
+    assert read_tree(tmp_path) == before
+
+
+def test_batch_failures(tmp_path: Path):
+    folders = make_folders(tmp_path, 2)
+    (tmp_path / "file").write_bytes(b"")
+    Path(batch.config_for(folders[1])).write_bytes(b"config")
+    results = batch.batch_hide(
+        folders + [str(tmp_path / "file")],
+        PASSWORD,
+        workers=1,
+        kdf_cost=MIN_KDF_COST,
+    )
+    errors = {result.target: result.errors for result in results}
+    assert errors == {
+        folders[0]: [],
+        folders[1]: ["Config " + batch.config_for(folders[1]) + " already exists."],
+        str(tmp_path / "file"): ["Not a folder."],
+    }
+
+    missing = str(tmp_path / "missing.enc")
+    results = batch.batch_unhide(
+        [batch.config_for(folders[0]), missing], "wrong", workers=1
+    )
+    errors = {result.target: result.errors for result in results}
+    assert errors == {
+        batch.config_for(folders[0]): ["Wrong config password!"],
+        missing: ["No such file or directory"],
+    }
@@ -0,0 +1,90 @@
+"""Configs written by every earlier version of the format.
+
+The files in `data` were written by `hide` as each version shipped, from the
+tree in `conftest.FILES` with `PASSWORD`. Version 1 is the single JSON list
+used before chunked configs. Versions 4 and 5 were hidden with
+`--shard-depth 1`, 7 with `--hash`, 8 with `--exclude '*.log'` and 9 with
+`--pack-below 4K`.
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from folderhide import core
+from folderhide.config import VERSION, ConfigReader
+from tests.conftest import FILES, PASSWORD, quiet, read_tree
+
+DATA = Path(__file__).parent / "data"
+
+
+def read(version: int):
+    with open(DATA / ("config_v%d.enc" % version), "rb") as f:
+        reader = ConfigReader(f, PASSWORD)
+        return reader, list(reader)
+
+
+@pytest.mark.parametrize("version", range(1, VERSION + 1))
+def test_read(version: int):
+    reader, entries = read(version)
+    assert reader.version == version
+    assert reader.total == len(entries)
+
+    expected = set(FILES)
+    if version == 8:
+        expected.discard("data/skip.log")
+    assert {entry.original for entry in entries} == expected
+
+    assert (reader.layout is not None) == (version >= 4)
+    assert (reader.index is not None) == (version >= 6)
+    if version >= 4:
+        depth = 1 if version in (4, 5) else 0
+        assert reader.layout.depth == depth
+        for entry in entries:
+            assert entry.modified.startswith(reader.layout.target + os.sep)
+            assert len(Path(entry.modified).parts) == 2 + depth
+
+    if version >= 7:
+        assert all(entry.size == len(FILES[entry.original]) for entry in entries)
+    else:
+        assert {entry.size for entry in entries} == {-1}
+    assert all(entry.digest for entry in entries) == (version == 7)
+    assert any(entry.offset >= 0 for entry in entries) == (version == 9)
+    assert reader.packs() == sorted({e.modified for e in entries if e.offset >= 0})
+    if version == 8:
+        assert reader.path_filter.exclude == ["*.log"]
+
+
+def test_wrong_password():
+    with open(DATA / ("config_v%d.enc" % VERSION), "rb") as f:
+        with pytest.raises(ValueError):
+            ConfigReader(f, "wrong")
+
+
+@pytest.mark.parametrize("version", range(1, VERSION + 1))
+def test_unhide(tmp_path: Path, version: int):
+    # Puts the files where the config says they are hidden, then unhides them.
+    _, entries = read(version)
+    expected = {}
+    for entry in entries:
+        data = FILES[entry.original]
+        expected[entry.original] = data
+        hidden = tmp_path / entry.modified
+        hidden.parent.mkdir(parents=True, exist_ok=True)
+        if entry.offset < 0:
+            hidden.write_bytes(data)
+            continue
+        with open(hidden, "ab") as f:
+            assert f.tell() == entry.offset
+            f.write(data)
+
+    config = str(tmp_path / "cfg.enc")
+    shutil.copy(DATA / ("config_v%d.enc" % version), config)
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert stats.completed
+    assert read_tree(tmp_path / "data") == {
+        name[len("data/") :]: data for name, data in expected.items()
+    }
+    assert not os.path.exists(config)
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from folderhide import contents, core
+from folderhide.contents import TAG_SIZE, decrypt_stream, encrypt_stream
+from tests.conftest import PASSWORD, quiet, read_tree
+from tests.test_roundtrip import hidden_dir, hide
+
+KEY = bytes(16)
+
+
+def encrypt(tmp_path: Path, data: bytes, name: str = "name"):
+    (tmp_path / "plain").write_bytes(data)
+    with open(tmp_path / "plain", "rb") as src, open(tmp_path / "sealed", "wb") as dest:
+        encrypt_stream(KEY, name, src, dest)
+    return (tmp_path / "sealed").read_bytes()
+
+
+def decrypt(tmp_path: Path, data: bytes, name: str = "name"):
+    (tmp_path / "sealed").write_bytes(data)
+    with open(tmp_path / "sealed", "rb") as src, open(tmp_path / "out", "wb") as dest:
+        decrypt_stream(KEY, name, src, dest)
+    return (tmp_path / "out").read_bytes()
+
+
+@pytest.fixture
+def chunk_size(monkeypatch):
+    """Makes files be encrypted in chunks of 64 bytes, and returns the size
+    of an encrypted chunk."""
+    monkeypatch.setattr(contents, "CHUNK_SIZE", 64)
+    return 64 + TAG_SIZE
+
+
+@pytest.mark.parametrize("size", [0, 1, 63, 64, 65, 1000])
+def test_streams(tmp_path: Path, chunk_size, size: int):
+    data = bytes(range(256)) * 4
+    assert decrypt(tmp_path, encrypt(tmp_path, data[:size])) == data[:size]
+
+
+def test_tampered_chunks(tmp_path: Path, chunk_size):
+    sealed = encrypt(tmp_path, bytes(200))
+    chunks = [sealed[i : i + chunk_size] for i in range(0, len(sealed), chunk_size)]
+    assert len(chunks) == 4
+
+    flipped = bytearray(sealed)
+    flipped[10] ^= 1
+    swapped = chunks[1] + chunks[0] + chunks[2] + chunks[3]
+    for data in [bytes(flipped), swapped, b"".join(chunks[:-1]), sealed[:-1]]:
+        with pytest.raises(ValueError):
+            decrypt(tmp_path, data)
+
+    # The name of the hidden file is part of every nonce.
+    with pytest.raises(ValueError):
+        decrypt(tmp_path, sealed, "other")
+
+
+def test_unhide_tampered_file(tmp_path: Path, tree):
+    config = hide(tmp_path, encrypt_contents=True)
+    victim = max(hidden_dir(tmp_path).iterdir(), key=lambda path: path.stat().st_size)
+    data = bytearray(victim.read_bytes())
+    data[0] ^= 1
+    victim.write_bytes(data)
+
+    errors: List[str] = []
+    stats = core.unhide(PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors
+    # The file stays hidden, without anything written next to its original.
+    assert victim.read_bytes() == data
+    unhidden = read_tree(tmp_path / "data")
+    assert not any(name.endswith(contents.PART_SUFFIX) for name in unhidden)
+    assert len(unhidden) < len(tree)
+
+
+def test_verify_tampered_file(tmp_path: Path, tree):
+    config = hide(tmp_path, encrypt_contents=True, digests=True)
+    files = sorted(hidden_dir(tmp_path).iterdir(), key=lambda path: path.stat().st_size)
+    victim = files[-1]
+    data = bytearray(victim.read_bytes())
+    data[-1] ^= 1
+    victim.write_bytes(data)
+
+    # The size is right, only the contents give it away.
+    report = core.verify(PASSWORD, config, quiet, quiet, quiet)
+    assert report is not None
+    assert not report.changed
+    report = core.verify(PASSWORD, config, quiet, quiet, quiet, check_digests=True)
+    assert report is not None
+    assert len(report.changed) == 1
@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+from typing import Sequence
+
+import pytest
+
+from folderhide.utils import PathFilter, glob_prefix, walk_files
+from tests.conftest import write_tree
+
+TREE = [
+    "a.txt",
+    "a.log",
+    "build/out.bin",
+    "build/cache/x.bin",
+    "src/build/y.txt",
+    "src/main.txt",
+    "src/deep/er/z.txt",
+    "cache",
+    "photos/2020/p.jpg",
+    "photos/2021/q.jpg",
+]
+
+
+def walk(tmp_path: Path, include: Sequence[str] = (), exclude: Sequence[str] = ()):
+    write_tree(tmp_path / "root", {name: b"" for name in TREE})
+    path_filter = PathFilter(include, exclude)
+    found = walk_files(tmp_path / "root", tmp_path, path_filter)
+    return sorted(path.replace(os.sep, "/")[len("root/") :] for path in found)
+
+
+def test_glob_prefix():
+    assert glob_prefix("photos/20*/p.jpg") == "photos/20"
+    assert glob_prefix("[ab].txt") == ""
+    assert glob_prefix("plain") == "plain"
+
+
+@pytest.mark.parametrize(
+    "rule, excluded",
+    [
+        # Without "/", names match at any depth.
+        ("build", ["build/cache/x.bin", "build/out.bin", "src/build/y.txt"]),
+        ("*.log", ["a.log"]),
+        # With "/", paths match from the folder on.
+        ("build/cache", ["build/cache/x.bin"]),
+        ("/build", ["build/cache/x.bin", "build/out.bin"]),
+        ("/cache", ["cache"]),
+        ("deep/er", []),
+        ("photos/*/p.jpg", ["photos/2020/p.jpg"]),
+        # "*" already crosses directories, so "**" does too, but not the "/"
+        # around it.
+        ("src/**/z.txt", ["src/deep/er/z.txt"]),
+        ("src/**/main.txt", []),
+        # A trailing "/" only matches directories.
+        ("cache/", ["build/cache/x.bin"]),
+        ("cache", ["build/cache/x.bin", "cache"]),
+    ],
+)
+def test_exclude(tmp_path: Path, rule: str, excluded: Sequence[str]):
+    assert walk(tmp_path, exclude=[rule]) == sorted(set(TREE) - set(excluded))
+
+
+@pytest.mark.parametrize(
+    "rule, included",
+    [
+        ("*.jpg", ["photos/2020/p.jpg", "photos/2021/q.jpg"]),
+        ("photos/2021", ["photos/2021/q.jpg"]),
+        ("src", ["src/build/y.txt", "src/deep/er/z.txt", "src/main.txt"]),
+        ("cache/", ["build/cache/x.bin"]),
+    ],
+)
+def test_include(tmp_path: Path, rule: str, included: Sequence[str]):
+    assert walk(tmp_path, include=[rule]) == sorted(included)
+
+
+def test_exclude_wins(tmp_path: Path):
+    found = walk(tmp_path, include=["src", "*.txt"], exclude=["build", "main.txt"])
+    assert found == ["a.txt", "src/deep/er/z.txt"]
+
+
+def test_excluded_directories_are_not_opened(tmp_path: Path, monkeypatch):
+    opened = []
+    scandir = os.scandir
+
+    def recording(path):
+        opened.append(os.path.relpath(path, tmp_path / "root"))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", recording)
+    walk(tmp_path, include=["photos/2020"], exclude=["build"])
+    assert "build" not in opened
+    assert os.path.join("photos", "2021") not in opened
+    assert os.path.join("photos", "2020") in opened
@@ -0,0 +1,46 @@
+"""Start up of the CLI, checked like `benchmarks.bench_import` does."""
+import subprocess
+import sys
+from typing import List, Tuple
+
+from benchmarks.bench_import import is_deferred
+
+BUDGET_MS = 60.0
+RUNS = 3
+
+
+def run_cli() -> Tuple[float, List[str]]:
+    """Runs `python -m folderhide --help` and returns the time spent
+    importing from the folderhide package on, in milliseconds, and every
+    module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "folderhide", "--help"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: List[str] = []
+    total = 0
+    started = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.append(name.strip())
+        started = started or name.strip() == "folderhide"
+        # Nested imports are already in the cumulative time of their parent.
+        if started and not name.startswith("  "):
+            total += int(cumulative)
+
+    assert "folderhide.cli" in modules
+    return total / 1000, modules
+
+
+def test_deferred_modules():
+    _, modules = run_cli()
+    assert [name for name in modules if is_deferred(name)] == []
+
+
+def test_budget():
+    best = min(run_cli()[0] for _ in range(RUNS))
+    assert best <= BUDGET_MS
@@ -0,0 +1,95 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from folderhide import core, utils
+from folderhide.config import MAGIC, ConfigReader, read_kdf_params
+from folderhide.utils import (
+    MAX_KDF_COST,
+    MIN_KDF_COST,
+    calibrate_kdf,
+    derive_key,
+    new_kdf_params,
+)
+from tests.conftest import PASSWORD, quiet
+from tests.test_roundtrip import hide
+
+# Offsets of log2(N), r and p in the header.
+LOG_N = len(MAGIC) + 1
+R = LOG_N + 1
+P = LOG_N + 2
+
+
+def test_header_records_params(tmp_path: Path, tree):
+    config = str(tmp_path / "cfg.enc")
+    data = str(tmp_path / "data")
+    core.hide(data, PASSWORD, config, quiet, quiet, quiet, kdf_cost=MIN_KDF_COST + 1)
+    with open(config, "rb") as f:
+        kdf = read_kdf_params(f)
+    assert kdf[:3] == (MIN_KDF_COST + 1, 8, 1)
+    assert kdf.salt != utils.KDFParams().salt
+
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert stats.completed
+
+
+def test_salts_differ():
+    kdf = new_kdf_params(MIN_KDF_COST)
+    other = new_kdf_params(MIN_KDF_COST)
+    assert kdf.salt != other.salt
+    assert derive_key(PASSWORD, kdf) != derive_key(PASSWORD, other)
+
+
+def test_keys_are_cached():
+    kdf = new_kdf_params(MIN_KDF_COST)
+    key = derive_key(PASSWORD, kdf)
+    hits = utils._scrypt.cache_info().hits
+    assert derive_key(PASSWORD, kdf) == key
+    assert utils._scrypt.cache_info().hits == hits + 1
+    assert derive_key("other", kdf) != key
+
+
+def test_calibration_is_bounded():
+    assert calibrate_kdf(1e-9) == MIN_KDF_COST
+    assert calibrate_kdf(1e9) == MAX_KDF_COST
+
+
+def test_calibration_fits_budget(monkeypatch):
+    # A derivation at the default cost is made to take exactly 0.1 seconds.
+    clock = iter([0.0, 0.1])
+    monkeypatch.setattr(utils.time, "perf_counter", lambda: next(clock))
+    assert calibrate_kdf(0.8) == utils.DEFAULT_KDF_COST + 3
+
+
+def tamper(config: str, offset: int, value: int):
+    with open(config, "r+b") as f:
+        f.seek(offset)
+        f.write(bytes([value]))
+
+
+@pytest.mark.parametrize(
+    "offset, value", [(R, 0), (P, 0), (LOG_N, 9), (LOG_N, 40), (R, 255)]
+)
+def test_invalid_kdf_params(tmp_path: Path, tree, offset: int, value: int):
+    config = hide(tmp_path)
+    tamper(config, offset, value)
+    with open(config, "rb") as f:
+        with pytest.raises(ValueError):
+            read_kdf_params(f)
+        with pytest.raises(ValueError):
+            ConfigReader(f, PASSWORD)
+
+    errors: List[str] = []
+    stats = core.unhide(PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors == ["Wrong config password!"]
+
+
+def test_truncated_header(tmp_path: Path, tree):
+    config = hide(tmp_path)
+    with open(config, "r+b") as f:
+        f.truncate(LOG_N + 4)
+    with open(config, "rb") as f:
+        with pytest.raises(ValueError):
+            ConfigReader(f, PASSWORD)
@@ -0,0 +1,148 @@
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from folderhide import core
+from folderhide.journal import Journal, journal_path
+from folderhide.mover import DirectoryCache
+from folderhide.utils import MIN_KDF_COST
+from tests.conftest import PASSWORD, quiet, read_tree
+from tests.test_roundtrip import hidden_dir, hide
+
+OPTIONS = [
+    {},
+    {"jobs": 4},
+    {"shard_depth": 2},
+    {"encrypt_contents": True},
+    {"pack_below": 1024},
+]
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(monkeypatch, cls, name: str, calls: int):
+    """Makes `cls.name` raise once it has been called `calls` times."""
+    original = getattr(cls, name)
+    count = [0]
+
+    def crashing(*args, **kwargs):
+        count[0] += 1
+        if count[0] > calls:
+            raise Crash()
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(cls, name, crashing)
+
+
+def resume(config: str):
+    stats = core.resume(PASSWORD, config, quiet, quiet, quiet)
+    assert stats.completed
+    assert not journal_path(config).exists()
+    return stats
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_resume_hide(tmp_path: Path, tree, monkeypatch, options):
+    # The move of the file after the 20th commit is done, but never recorded.
+    crash_after(monkeypatch, Journal, "commit", 20)
+    config = str(tmp_path / "cfg.enc")
+    stats = core.hide(
+        str(tmp_path / "data"),
+        PASSWORD,
+        config,
+        quiet,
+        quiet,
+        quiet,
+        kdf_cost=MIN_KDF_COST,
+        **options,
+    )
+    assert not stats.completed
+    assert journal_path(config).exists()
+    monkeypatch.undo()
+
+    resume(config)
+    assert read_tree(tmp_path / "data") == {}
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert read_tree(tmp_path) == tree
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_resume_unhide(tmp_path: Path, tree, monkeypatch, options):
+    config = hide(tmp_path, **options)
+    crash_after(monkeypatch, Journal, "commit", 20)
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert not stats.completed
+    monkeypatch.undo()
+
+    resume(config)
+    assert read_tree(tmp_path) == tree
+    assert not Path(config).exists()
+
+
+def test_resume_after_failed_move(tmp_path: Path, tree, monkeypatch):
+    config = hide(tmp_path)
+    crash_after(monkeypatch, DirectoryCache, "move", 10)
+    errors: List[str] = []
+    stats = core.unhide(PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors
+    monkeypatch.undo()
+
+    stats = resume(config)
+    assert stats.files_moved == len(tree) - 10
+    assert read_tree(tmp_path) == tree
+
+
+def test_unfinished_operation_blocks_others(tmp_path: Path, tree, monkeypatch):
+    config = hide(tmp_path)
+    crash_after(monkeypatch, Journal, "commit", 0)
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    monkeypatch.undo()
+
+    errors: List[str] = []
+    stats = core.unhide(PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert "Run the resume command" in errors[-1]
+    resume(config)
+    assert read_tree(tmp_path) == tree
+
+
+def test_resume_counts_skipped_moves(tmp_path: Path, tree, monkeypatch):
+    config = hide(tmp_path)
+    # The 21st file is moved, but the crash comes before it is recorded.
+    crash_after(monkeypatch, Journal, "commit", 20)
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    monkeypatch.undo()
+
+    stats = resume(config)
+    assert stats.files_skipped == 1
+    assert stats.files_moved == len(tree) - 21
+    assert read_tree(tmp_path) == tree
+
+
+def test_resume_unhide_only(tmp_path: Path, tree, monkeypatch, small_chunks):
+    config = hide(tmp_path, pack_below=1024)
+    crash_after(monkeypatch, Journal, "commit", 10)
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet, only="data/many/*")
+    assert not stats.completed
+    monkeypatch.undo()
+
+    resume(config)
+    assert read_tree(tmp_path / "data") == {
+        name[len("data/") :]: data
+        for name, data in tree.items()
+        if name.startswith("data/many/")
+    }
+    listed: List[str] = []
+    core.list_files(PASSWORD, config, "", listed.append, quiet, quiet)
+    assert listed == sorted(
+        name.replace("/", os.sep) for name in tree if not name.startswith("data/many/")
+    )
+
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert read_tree(tmp_path) == tree
+    assert os.listdir(hidden_dir(tmp_path)) == []
@@ -0,0 +1,252 @@
+import os
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from folderhide import core, digest, utils
+from folderhide.progress import ProgressUpdate
+from folderhide.utils import LEAF_DIRS, MIN_KDF_COST
+from tests.conftest import PASSWORD, quiet, read_tree
+
+
+def hide(root: Path, **kwargs):
+    config = str(root / "cfg.enc")
+    stats = core.hide(
+        str(root / "data"),
+        PASSWORD,
+        config,
+        quiet,
+        quiet,
+        quiet,
+        kdf_cost=MIN_KDF_COST,
+        **kwargs,
+    )
+    assert stats.completed
+    return config
+
+
+def hidden_dir(root: Path):
+    return next(path for path in root.iterdir() if path.name.startswith("."))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"jobs": 4},
+        {"shard_depth": 2, "shard_width": 2, "jobs": 4},
+        {"encrypt_contents": True},
+        {"digests": True},
+        {"whole_dirs": 1},
+        {"whole_dirs": LEAF_DIRS},
+        {"pack_below": 1024},
+        {"pack_below": 1024, "shard_depth": 1, "jobs": 4},
+    ],
+)
+def test_hide_unhide(tmp_path: Path, tree, options):
+    config = hide(tmp_path, **options)
+    assert read_tree(tmp_path / "data") == {}
+    if options.get("encrypt_contents"):
+        hidden = read_tree(hidden_dir(tmp_path)).values()
+        assert not set(hidden) & set(tree.values())
+
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet, jobs=2)
+    assert stats.completed
+    assert read_tree(tmp_path) == tree
+    assert not os.path.exists(config)
+    assert os.listdir(hidden_dir(tmp_path)) == []
+
+
+def test_unhide_only(tmp_path: Path, tree):
+    config = hide(tmp_path, pack_below=1024)
+    core.unhide(PASSWORD, config, quiet, quiet, quiet, only="data/sub/*")
+    assert read_tree(tmp_path / "data") == {
+        name[len("data/") :]: data
+        for name, data in tree.items()
+        if name.startswith("data/sub/")
+    }
+
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert read_tree(tmp_path) == tree
+
+
+@pytest.mark.parametrize(
+    "only",
+    [
+        "data/many/0*",
+        "data/s*",
+        "data/a.txt",
+        "data/many/*/file1*",
+        "data/many/03/*",
+        "other/*",
+    ],
+)
+def test_unhide_only_prefixes(tmp_path: Path, tree, small_chunks, only: str):
+    config = hide(tmp_path)
+    core.unhide(PASSWORD, config, quiet, quiet, quiet, only=only)
+    expected = {name: data for name, data in tree.items() if fnmatchcase(name, only)}
+    assert read_tree(tmp_path / "data") == {
+        name[len("data/") :]: data for name, data in expected.items()
+    }
+
+    listed: List[str] = []
+    core.list_files(PASSWORD, config, "", listed.append, quiet, quiet)
+    assert listed == sorted(
+        name.replace("/", os.sep) for name in tree if name not in expected
+    )
+
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert read_tree(tmp_path) == tree
+
+
+def test_ls_sorted(tmp_path: Path, tree, small_chunks):
+    config = hide(tmp_path)
+    (tmp_path / "data" / "many" / "00" / "appended.txt").write_bytes(b"new")
+    core.append(str(tmp_path / "data"), PASSWORD, config, quiet, quiet, quiet)
+    listed: List[str] = []
+    core.list_files(PASSWORD, config, "data/many/", listed.append, quiet, quiet)
+    assert listed == sorted(
+        name.replace("/", os.sep)
+        for name in list(tree) + ["data/many/00/appended.txt"]
+        if name.startswith("data/many/")
+    )
+
+
+def test_append(tmp_path: Path, tree):
+    config = hide(tmp_path, exclude=["*.log"])
+    (tmp_path / "data" / "new.txt").write_bytes(b"new")
+    stats = core.append(str(tmp_path / "data"), PASSWORD, config, quiet, quiet, quiet)
+    assert stats.files_moved == 1
+
+    core.unhide(PASSWORD, config, quiet, quiet, quiet)
+    assert read_tree(tmp_path) == dict(tree, **{"data/new.txt": b"new"})
+
+
+def test_verify(tmp_path: Path, tree):
+    config = hide(tmp_path, digests=True)
+    report = core.verify(PASSWORD, config, quiet, quiet, quiet, check_digests=True)
+    assert report is not None
+    assert report.checked == len(tree)
+    assert not report.missing and not report.changed
+
+    victim = next(path for path in hidden_dir(tmp_path).iterdir())
+    victim.write_bytes(victim.read_bytes() + b"!")
+    report = core.verify(PASSWORD, config, quiet, quiet, quiet, check_digests=True)
+    assert report is not None
+    assert len(report.changed) == 1
+
+
+def test_wrong_password(tmp_path: Path, tree):
+    config = hide(tmp_path)
+    errors: List[str] = []
+    stats = core.unhide("wrong", config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors == ["Wrong config password!"]
+
+
+def test_sizes_without_progress(tmp_path: Path, tree):
+    # What goes into the config doesn't depend on progress being reported.
+    config = str(tmp_path / "cfg.enc")
+    stats = core.hide(
+        str(tmp_path / "data"),
+        PASSWORD,
+        config,
+        quiet,
+        quiet,
+        quiet,
+        kdf_cost=MIN_KDF_COST,
+    )
+    assert stats.bytes_moved == sum(map(len, tree.values()))
+
+    victim = max(hidden_dir(tmp_path).iterdir(), key=lambda path: path.stat().st_size)
+    victim.write_bytes(victim.read_bytes()[:-1])
+    report = core.verify(PASSWORD, config, quiet, quiet, quiet)
+    assert report is not None
+    assert len(report.changed) == 1
+    assert report.unsized == 0
+
+
+@pytest.mark.parametrize("options", [{}, {"pack_below": 1024}])
+def test_unhide_sizes(tmp_path: Path, tree, options):
+    config = hide(tmp_path, **options)
+    updates: List[ProgressUpdate] = []
+    stats = core.unhide(PASSWORD, config, quiet, quiet, quiet, updates.append)
+    assert stats.bytes_moved == sum(map(len, tree.values()))
+    assert updates[-1].bytes_total == stats.bytes_moved
+
+
+@pytest.mark.parametrize("options", [{}, {"shard_depth": 1}])
+def test_unhide_only_in_parts(tmp_path: Path, tree, monkeypatch, options):
+    # Every pack is removed by the last unhide, even packs emptied before it.
+    monkeypatch.setattr(utils, "PACK_SIZE", 256)
+    config = hide(tmp_path, pack_below=1024, **options)
+    for only in ["data/many/0*", "data/sub/*", "data/many/*"]:
+        core.unhide(PASSWORD, config, quiet, quiet, quiet, only=only)
+    assert os.listdir(hidden_dir(tmp_path)) != []
+
+    core.unhide(PASSWORD, config, quiet, quiet, quiet, only="data/*")
+    assert read_tree(tmp_path) == tree
+    assert not os.path.exists(config)
+    assert os.listdir(hidden_dir(tmp_path)) == []
+
+
+def test_append_other_folder(tmp_path: Path, tree):
+    config = hide(tmp_path)
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "new.txt").write_bytes(b"new")
+    errors: List[str] = []
+    folder = str(tmp_path / "other")
+    stats = core.append(folder, PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors == [folder + " is not the folder hidden with " + config + "."]
+    assert read_tree(tmp_path / "other") == {"new.txt": b"new"}
+
+
+def fail_to_read(monkeypatch, name: str):
+    file_digest = digest.file_digest
+
+    def failing(path: str, *args):
+        if path.endswith(name):
+            raise PermissionError(path)
+        return file_digest(path, *args)
+
+    monkeypatch.setattr(digest, "file_digest", failing)
+
+
+def test_hash_unreadable_file(tmp_path: Path, tree, monkeypatch):
+    fail_to_read(monkeypatch, "a.txt")
+    errors: List[str] = []
+    config = str(tmp_path / "cfg.enc")
+    stats = core.hide(
+        str(tmp_path / "data"),
+        PASSWORD,
+        config,
+        quiet,
+        quiet,
+        errors.append,
+        kdf_cost=MIN_KDF_COST,
+        digests=True,
+    )
+    assert not stats.completed
+    assert errors == [
+        "Could not read " + os.path.join("data", "a.txt"),
+        "Nothing was hidden.",
+    ]
+    assert not os.path.exists(config)
+    assert read_tree(tmp_path) == tree
+
+
+def test_append_hash_unreadable_file(tmp_path: Path, tree, monkeypatch):
+    config = hide(tmp_path, digests=True)
+    before = Path(config).read_bytes()
+    (tmp_path / "data" / "new.txt").write_bytes(b"new")
+    fail_to_read(monkeypatch, "new.txt")
+    errors: List[str] = []
+    data = str(tmp_path / "data")
+    stats = core.append(data, PASSWORD, config, quiet, quiet, errors.append)
+    assert not stats.completed
+    assert errors[-1] == "Nothing was hidden."
+    assert Path(config).read_bytes() == before
+    assert read_tree(tmp_path / "data") == {"new.txt": b"new"}